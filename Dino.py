@@ -1,7 +1,10 @@
 import random
-import os
 
-import pygame
+import numpy as np
+
+from engine import Dino_engine
+from network import load_network
+from observation import DEFAULT_FEATURES, Observation
 
 
 class Dino_player:
@@ -24,12 +27,17 @@ class Dino_player:
         """
         return True
 
+    def reset(self):
+        """Forget the previous game, called when a new game starts."""
+        pass
+
 
 class Dino_player_random(Dino_player):
     """Random player class for the Dino game."""
 
-    def __init__(self, jump_probabilty = 0.3):
+    def __init__(self, jump_probabilty = 0.3, seed = None):
         self.jump_probability = jump_probabilty
+        self.rng = random.Random(seed)
 
     def get_action(self, state, current_score):
         """Return True to jump.
@@ -38,141 +46,332 @@ class Dino_player_random(Dino_player):
         state -- current state of the game
         current_score -- current score of the game
         """
-        gen_num = random.uniform(0,1)
+        gen_num = self.rng.uniform(0,1)
         if gen_num < self.jump_probability:
             return True
         else:
             return False
 
 
+class Dino_player_compiled(Dino_player):
+    """Player using a network exported by NEAT_trainer.export_champion,
+    only NumPy is needed to load and play it."""
+
+    def __init__(self, path, jump_threshold = 0.5):
+        """Load the network.
+
+        Keyword arguments:
+        path -- .npz file of the network
+        jump_threshold -- output value from which the player jumps
+                          (default 0.5)
+        """
+        self.network, metadata = load_network(path)
+        self.features = DEFAULT_FEATURES
+        if "features" in metadata:
+            self.features = tuple(metadata["features"].tolist())
+        # Normalization of the features the network was trained with.
+        self.feature_offset = metadata.get("feature_offset")
+        self.feature_scale = metadata.get("feature_scale")
+        self.jump_threshold = jump_threshold
+        self.inputs = np.ones(self.network.n_inputs)
+
+    def get_action(self, state, current_score):
+        """Return True to jump.
+
+        Keyword arguments:
+        state -- current state of the game
+        current_score -- current score of the game
+        """
+        self.inputs[:len(state)] = state
+        output = self.network.activate(self.inputs)
+        return bool(output[0] >= self.jump_threshold)
+
+    def reset(self):
+        """Reset the activations of the network."""
+        self.network.flush()
+
+
+class Dino_population:
+    """Basic class for a group of players deciding their moves together."""
+
+    def __init__(self, size):
+        self.size = size
+        # Number of moves asked to the players and skipped by decide.
+        self.activations = 0
+        self.activations_saved = 0
+
+    def __len__(self):
+        return self.size
+
+    def get_actions(self, state, current_score, alive):
+        """Return a jump flag for every player.
+
+        Keyword arguments:
+        state -- current state of the game, shared by every player
+        current_score -- current score of the game
+        alive -- boolean mask of the players still running
+        """
+        return np.zeros(self.size, dtype=bool)
+
+    def decide(self, state, current_score, alive, deciding = None):
+        """Ask the players in deciding for their next move and count the
+        moves asked and saved.
+
+        Keyword arguments:
+        state -- current state of the game
+        current_score -- current score of the game
+        alive -- boolean mask of the players still running
+        deciding -- boolean mask of the players to ask (default None, every
+                    player alive)
+        """
+        if deciding is None:
+            deciding = alive
+        asked = int(np.count_nonzero(deciding))
+        self.activations += asked
+        self.activations_saved += int(np.count_nonzero(alive)) - asked
+        if asked == 0:
+            return np.zeros(np.shape(alive), dtype=bool)
+        return self.get_actions(state, current_score, deciding)
+
+    def keep_playing(self, current_score):
+        """Return True to keep playing.
+
+        Keyword arguments:
+        current_score -- current score of the game
+        """
+        return True
+
+    def reset(self):
+        """Forget the previous game, called when a new game starts."""
+        pass
+
+
+class Dino_player_group(Dino_population):
+    """Population made of independent Dino_player objects."""
+
+    def __init__(self, players):
+        """Initialize the group.
+
+        Keyword arguments:
+        players -- list of Dino_player
+        """
+        assert all(isinstance(player, Dino_player) for player in players)
+        super().__init__(len(players))
+        self.players = list(players)
+
+    def get_actions(self, state, current_score, alive):
+        """Ask every player still alive for its next move.
+
+        Keyword arguments:
+        state -- current state of the game, a read-only view shared by
+                 every player or with one row per player
+        current_score -- current score of the game
+        alive -- boolean mask of the players still running
+        """
+        actions = np.zeros(self.size, dtype=bool)
+        for i in np.flatnonzero(alive):
+            player_state = state[i] if np.ndim(state) == 2 else state
+            actions[i] = self.players[i].get_action(player_state,
+                                                    current_score)
+        return actions
+
+    def keep_playing(self, current_score):
+        """Return True if any player wants to keep playing.
+
+        Keyword arguments:
+        current_score -- current score of the game
+        """
+        return any([player.keep_playing(current_score)
+                    for player in self.players])
+
+    def reset(self):
+        """Reset every player."""
+        for player in self.players:
+            player.reset()
+
+
+class Render_policy:
+    """Which frames and which dinosaurs a watched game paints.
+
+    The simulation runs every frame whatever the mode, painting fewer
+    frames or fewer dinosaurs only saves the time of the blits (and of the
+    wait for the clock when a frame is skipped). The modes are:
+    "all" -- every dinosaur alive at every frame
+    "every" -- every dinosaur alive every interval frames
+    "top" -- only the top_k best ranked dinosaurs alive
+    "elite" -- only the best ranked dinosaur alive
+    "none" -- nothing, the window keeps the last frame painted
+    """
+
+    MODES = ("all", "every", "top", "elite", "none")
+
+    def __init__(self, mode = "all", interval = 4, top_k = 10):
+        """Initialize the policy.
+
+        Keyword arguments:
+        mode -- one of MODES (default "all")
+        interval -- frames between two painted frames in the "every"
+                    mode (default 4)
+        top_k -- number of dinosaurs painted in the "top" mode
+                 (default 10)
+        """
+        if mode not in self.MODES:
+            raise ValueError("unknown render mode " + str(mode))
+        self.mode = mode
+        self.interval = interval
+        self.top_k = top_k
+        # Players from the best to the worst, None keeps their order.
+        self.ranking = None
+
+    def next_mode(self):
+        """Switch to the next mode and return it."""
+        self.mode = self.MODES[(self.MODES.index(self.mode) + 1)
+                               % len(self.MODES)]
+        return self.mode
+
+    def rank(self, fitness):
+        """Rank the players by a previous fitness, the best first.
+
+        Keyword arguments:
+        fitness -- fitness of every player, for example the fitness of the
+                   genomes kept from the previous generation
+        """
+        self.ranking = np.argsort(-np.asarray(fitness, dtype=float),
+                                  kind="stable")
+
+    def should_render(self, frame):
+        """Return True if the frame must be painted."""
+        if self.mode == "none":
+            return False
+        if self.mode == "every":
+            return frame % self.interval == 0
+        return True
+
+    def shown(self, alive):
+        """Return the indices of the dinosaurs to paint, None for every
+        dinosaur alive.
+
+        Keyword arguments:
+        alive -- boolean mask of the players still running
+        """
+        if self.mode == "top":
+            count = self.top_k
+        elif self.mode == "elite":
+            count = 1
+        else:
+            return None
+        if self.ranking is None or len(self.ranking) != len(alive):
+            return np.flatnonzero(alive)[:count]
+        return self.ranking[alive[self.ranking]][:count]
+
+    def describe(self):
+        """Return the mode as shown in the HUD."""
+        if self.mode == "every":
+            return "render every " + str(self.interval) + " frames"
+        if self.mode == "top":
+            return "render top " + str(self.top_k)
+        return "render " + self.mode
+
+
 class Dino:
-    """The main class of the Google Chrome Dinosaur game."""
+    """The main class of the Google Chrome Dinosaur game.
+
+    The game runs the loop for 1..N players: the rules live in a
+    Dino_engine, the painting in a renderer (renderer_class) and the
+    decisions in the players, so each of them can be swapped. pygame is
+    only imported by the games opening a window.
+    """
+
+    # Class of the renderer, None for renderer.Dirty_rect_renderer.
+    renderer_class = None
 
-    def __init__(self, player, text = None):
+    def __init__(self, players, text = None, seed = None, headless = False,
+                 decision_interval = 1, skip_airborne = False,
+                 stopping = None, features = DEFAULT_FEATURES,
+                 feature_offset = None, feature_scale = None,
+                 profiler = None, render_policy = None):
         """Initialize the variables and declare constants.
 
         Keyword arguments:
-        player -- variable of Dino_player type
+        players -- a Dino_player, a list of them or a Dino_population
         text -- text to be displayed during the game
+        seed -- seed of the obstacles (default None, random games)
+        headless -- simulate without opening a window (default False)
+        decision_interval -- ask the players for a move every
+                             decision_interval frames (default 1)
+        skip_airborne -- do not ask the players in the middle of a jump
+                         (default False)
+        stopping -- Stopping_rules ending a game early, the players still
+                    alive get the current score (default None)
+        features -- features of the state given to the players, see
+                    observation.FEATURES (default DEFAULT_FEATURES)
+        feature_offset -- value subtracted from every feature, see
+                          Observation (default None)
+        feature_scale -- value multiplying every feature after the
+                         offset, see Observation (default None)
+        profiler -- Frame_profiler timing the phases of every frame
+                    (default None)
+        render_policy -- Render_policy choosing the frames and the
+                         dinosaurs painted, switched with the 'r' key
+                         (default None, everything is painted)
         """
-        assert isinstance(player, Dino_player)
-        # Declare constants.
-        self.SIZE = self.WEIGHT, self.HEIGHT = 640, 400
-        self.DINO_INITIAL_X = 100
-        self.DINO_INITIAL_Y = 250
-        self.MAX_JUMP_HEIGHT = 100
-        self.JUMP_SPEED_A = 0.5
-        self.JUMP_SPEED_D = 0.5
-        self.DINO_MOVE_SPEED = 0.1
-        self.GROUND_INITIAL_SPEED = 6
-        self.COLLISION_FORGIVE = 8
+        if isinstance(players, Dino_player):
+            players = [players]
+        if not isinstance(players, Dino_population):
+            players = Dino_player_group(players)
+        # Initialize the simulation.
+        self.players = players
+        observation = Observation(features, len(players),
+                                  offset = feature_offset,
+                                  scale = feature_scale)
+        self.engine = Dino_engine(len(players), seed = seed,
+                                  observation = observation)
+        self.engine.profiler = profiler
+        self.SIZE = self.engine.SIZE
         # Initialize flags.
         self.running = True
         self.playing = False
-        self.jumping_a = False
-        self.jumping_d = False
         self.first_frame = True
         self.rendered = False
+        self.window_closed = False
+        self.headless = headless
+        self.decision_interval = decision_interval
+        self.skip_airborne = skip_airborne
+        self.stopping = stopping
+        self.profiler = profiler
+        self.render_policy = render_policy
+        self.painting = True
         # Initialize rest of variables.
-        self.player = player
         self.text = text
-        self.display_surf = None
-        self.move_counter = 0
-        self.game_time = 0
+        self.renderer = None
         self.most_recent_score = 0
-        self.obstacle_distance = 0
-        self.possible_obstacles = list()
-        self.obstacles = list()
-        self.start_playing_event = pygame.event.Event(
-                pygame.USEREVENT, attr1='start_playing'
-                )
+        self.start_playing_event = None
 
     def on_init(self):
-        """Initialize the pygame specific variables
-        and load the images.
-        """
-        script_dir = os.path.dirname(__file__)
-        # Initialize the main window.
-        pygame.init()
-        logo = pygame.image.load(os.path.join(script_dir, "images/dino.jpg"))
-        pygame.display.set_icon(logo)
-        pygame.display.set_caption("Dino")
-        self.display_surf = pygame.display.set_mode(
-                self.SIZE, pygame.HWSURFACE | pygame.DOUBLEBUF
-                )
-        # Initialize the clock and the font system.
-        self.clock = pygame.time.Clock()
-        pygame.font.init()
-        self.text_font = pygame.font.SysFont('Comic Sans MS', 20)
-        self.instuction_up = self.text_font.render(
-                        "Press the UP arrow to jump",
-                        False,
-                        (0, 0, 0)
-                        )
-        # Load the ground image, split it and save the fragments in a list.
-        ground = pygame.image.load(os.path.join(script_dir,
-                                                "images/ground.png"))
-        ground.set_colorkey((64, 202, 201))
-        self.ground_parts = []
-        x, y, dx, dy = 0, 0, 1, ground.get_height()
-        self.ground = ground
-        while x<ground.get_width():
-            rect = pygame.Rect((x,y,dx,dy))
-            ground_part = pygame.Surface(rect.size).convert()
-            ground_part.blit(ground, (0, 0), rect)
-            ground_part.set_colorkey((64,202,201))
-            self.ground_parts.append(ground_part)
-            x += dx
-        #Load the obstacle sprites.
-        cactus_b_1 = pygame.image.load(
-                os.path.join(script_dir, "images/cactus_b_1.png")
-                ).convert()
-        cactus_b_1.set_colorkey((64,202,201))
-        self.possible_obstacles.append(cactus_b_1)
-        cactus_s_1 = pygame.image.load(
-                os.path.join(script_dir, "images/cactus_s_1.png")
-                ).convert()
-        cactus_s_1.set_colorkey((64,202,201))
-        self.possible_obstacles.append(cactus_s_1)
-        #Load the dinosaur sprites and initialize the rest of the variables.
-        self.dino_move_1 = pygame.image.load(
-                os.path.join(script_dir, "images/dino_move_1.png")
-                ).convert()
-        self.dino_move_1.set_colorkey((64,202,201))
-        self.dino_move_2 = pygame.image.load(
-                os.path.join(script_dir, "images/dino_move_2.png")
-                ).convert()
-        self.dino_move_2.set_colorkey((64,202,201))
-        self.dino_jump = pygame.image.load(
-                os.path.join(script_dir, "images/dino_jump.png")
-                ).convert()
-        self.dino_jump.set_colorkey((64,202,201))
-        self.dino_dead = pygame.image.load(
-                os.path.join(script_dir, "images/dino_dead.png")
-                ).convert()
-        self.dino_dead.set_colorkey((64,202,201))
-        self.dino_y = self.DINO_INITIAL_Y
-        self.dino_x = self.DINO_INITIAL_X
+        """Create the renderer unless the game is headless."""
+        if not self.headless:
+            import pygame
+            from renderer import Dirty_rect_renderer
+            renderer_class = self.renderer_class or Dirty_rect_renderer
+            self.renderer = renderer_class(self.engine)
+            self.start_playing_event = pygame.event.Event(
+                    pygame.USEREVENT, attr1='start_playing'
+                    )
         self.running = True
 
     def reinit(self):
         """Reinitialize the flags and variables."""
-        self.dino_y = self.DINO_INITIAL_Y
-        self.dino_x = self.DINO_INITIAL_X
-        self.obstacles = list()
-        self.obstacle_distance = 0
-        self.move_counter = 0
-        self.game_time = 0
-        self.ground_move = 0
+        self.engine.reset()
+        self.players.reset()
         self.playing = True
-        self.jumping_a = False
-        self.jumping_d = False
-        self.clock.tick(60)
+        if self.stopping is not None:
+            self.stopping.start_game()
+        if self.renderer is not None:
+            self.renderer.tick()
 
-    def jump(self):
+    def jump(self, player = 0):
         """Trigger jumping event if possible."""
-        if not(self.jumping_a or self.jumping_d):
-            self.jumping_a = True
+        self.engine.jump(player)
 
     def stop(self):
         """Stop playing."""
@@ -184,12 +383,20 @@ class Dino:
     def play(self):
         """Start playing."""
         if not self.playing:
+            import pygame
             pygame.event.post(self.start_playing_event)
 
+    def keep_playing(self):
+        """Return True to wait for a new game once every player is dead."""
+        return (not self.headless
+                and self.players.keep_playing(self.engine.score))
+
     def on_event(self, event):
         """Detect events and change flags accordingly."""
+        import pygame
         if event.type == pygame.QUIT:
             self.running = False
+            self.window_closed = True
         if event == self.start_playing_event:
             self.reinit()
         if event.type == pygame.KEYDOWN:
@@ -197,275 +404,134 @@ class Dino:
                 self.jump()
             if event.key == pygame.K_s and not(self.playing):
                 self.reinit()
+            if event.key == pygame.K_r:
+                self.switch_render_mode()
+
+    def switch_render_mode(self):
+        """Switch the render policy to its next mode."""
+        if self.render_policy is not None:
+            self.render_policy.next_mode()
+
+    def render_due(self):
+        """Return True if the next frame must be painted."""
+        if self.headless:
+            return False
+        if self.render_policy is None or not self.playing:
+            return True
+        return self.render_policy.should_render(self.engine.frame + 1)
+
+    def lap(self, phase):
+        """Mark the end of a phase of the frame for the profiler."""
+        if self.profiler is not None:
+            self.profiler.lap(phase)
 
     def on_loop(self):
-        """Update variables and move objects."""
+        """Advance the simulation by one frame."""
         if self.playing:
-            dt = self.clock.tick(60)
-            self.game_time += dt
-            #Update dinosaur location if jumping.
-            if self.jumping_a:
-                if self.dino_y <= (self.DINO_INITIAL_Y-self.MAX_JUMP_HEIGHT):
-                    self.jumping_a = False
-                    self.jumping_d = True
-                elif self.dino_y<=(self.DINO_INITIAL_Y
-                                   - self.MAX_JUMP_HEIGHT/1.5):
-                    self.dino_y -= self.JUMP_SPEED_A*dt/2
-                else:
-                    self.dino_y -= self.JUMP_SPEED_A*dt
-            if self.jumping_d:
-                if self.dino_y >= self.DINO_INITIAL_Y:
-                    self.jumping_d = False
-                    self.dino_y = self.DINO_INITIAL_Y
-                elif self.dino_y <= (self.DINO_INITIAL_Y
-                                     - self.MAX_JUMP_HEIGHT/1.5):
-                    self.dino_y += self.JUMP_SPEED_D*dt/2
-                else:
-                    self.dino_y += self.JUMP_SPEED_D*dt
-            #Update dinosaur movement animaton
-            self.move_counter += self.DINO_MOVE_SPEED
-            if self.move_counter >= 10:
-                self.move_counter = 0
-            #Update ground location
-            self.ground_step = (
-                    self.GROUND_INITIAL_SPEED
-                    * ( 0.125*(self.game_time//10000) + 1)
-                    )
-            self.ground_parts = (
-                    self.ground_parts[int(self.ground_step):]
-                    + self.ground_parts[:int(self.ground_step)]
-                    )
-            #Generate obstacles and update their location
-            self.obstacle_distance += int(self.ground_step)
-            if 300 < self.obstacle_distance <= 900:
-                gen_num = random.uniform(0,1)
-                if gen_num < 0.05 :
-                    generate_obstacles = True
-                else:
-                    generate_obstacles = False
-            elif 900 < self.obstacle_distance:
-                generate_obstacles = True
-            else:
-                generate_obstacles = False
-            if generate_obstacles:
-                number_obstacles = random.randint(1,4)
-                last_x = self.display_surf.get_width()
-                for i in range(number_obstacles):
-                    chosen_obstacle = random.choice(self.possible_obstacles)
-                    self.obstacles.append([
-                            chosen_obstacle,
-                            [last_x, self.DINO_INITIAL_Y +
-                                self.dino_move_1.get_height() -
-                                chosen_obstacle.get_height()]
-                            ])
-                    last_x += chosen_obstacle.get_width()
-                self.obstacle_distance = 0
-            obstacles=list()
-            for obstacle in self.obstacles:
-                obstacle[1][0] -= int(self.ground_step)
-                if not obstacle[1][0] + obstacle[0].get_width() <= 0 :
-                    obstacles.append(obstacle)
-            self.obstacles = obstacles
+            if self.renderer is not None and self.painting:
+                self.renderer.tick()
+                self.lap("wait")
+            self.engine.step()
+            if self.renderer is not None:
+                self.renderer.scroll()
+            if (self.stopping is not None
+                    and self.stopping.should_stop(self.engine)):
+                self.engine.finish()
+            if self.engine.players_alive == 0:
+                self.playing = False
+                if self.running:
+                    self.running = self.keep_playing()
+            self.lap("physics")
 
-    def on_render(self):
-        """Clear screen and repaint objects with updated data."""
-        #Clear screen
-        self.display_surf.fill((255,255,255))
-        #Paint ground
-        ground_x=0
-        for ground in self.ground_parts:
-            self.display_surf.blit(ground, (ground_x,self.DINO_INITIAL_Y+35))
-            ground_x += ground.get_width()
-        #Paint instruction text
-        score = self.text_font.render(
-                str(int(self.game_time/100)),
-                False,
-                (0, 0, 0)
-                )
-        self.display_surf.blit(
-                score,
-                (self.display_surf.get_width() - (5+score.get_width()), 0)
-                )
+    def draw_hud(self):
+        """Paint the instructions or the text of the game."""
         if not self.playing:
             if self.first_frame:
-                instuction = self.text_font.render(
-                        "Press 's' to start",
-                        False,
-                        (0, 0, 0)
-                        )
+                self.renderer.draw_centered("Press 's' to start", 0)
             else:
-                instuction = self.text_font.render(
-                        "Press 's' to restart",
-                        False,
-                        (0, 0, 0)
-                        )
-            self.display_surf.blit(
-                    instuction,
-                    (self.display_surf.get_width()//2
-                     - instuction.get_width()//2,0)
-                    )
-            self.display_surf.blit(
-                    self.instuction_up,
-                    (self.display_surf.get_width()//2
-                     - self.instuction_up.get_width()//2,25)
-                    )
+                self.renderer.draw_centered("Press 's' to restart", 0)
+            self.renderer.draw_centered(self.renderer.instuction_up, 25)
         elif self.text is not None:
-            text = self.text_font.render(
-                        self.text,
-                        False,
-                        (0, 0, 0)
-                        )
-            self.display_surf.blit(
-                    text,
-                    (self.display_surf.get_width()//2
-                     - text.get_width()//2,0)
-                    )
-        #Paint Dinosaur
+            self.renderer.draw_centered(self.text, 0)
+
+    def on_render(self):
+        """Clear screen and repaint objects with updated data."""
+        renderer = self.renderer
+        renderer.draw_background()
+        self.lap("background")
+        renderer.draw_score()
+        self.draw_hud()
+        if self.profiler is not None and self.profiler.overlay:
+            renderer.draw_lines(self.profiler.overlay_lines, 5, 75)
+        self.lap("text")
+        #Paint Dinosaurs
         if self.playing:
-            if self.jumping_a or self.jumping_d:
-                dino_rect = self.display_surf.blit(
-                        self.dino_jump,
-                        (self.dino_x, self.dino_y)
-                        )
-            else:
-                if int(self.move_counter%2)==1:
-                    dino_rect = self.display_surf.blit(
-                            self.dino_move_1,
-                            (self.dino_x, self.dino_y)
-                            )
-                else:
-                    dino_rect = self.display_surf.blit(
-                            self.dino_move_2,
-                            (self.dino_x, self.dino_y)
-                            )
+            shown = None
+            if self.render_policy is not None:
+                shown = self.render_policy.shown(self.engine.alive)
+            renderer.draw_dinos(players = shown)
+        elif self.first_frame:
+            renderer.draw_dinos(renderer.dino_jump)
+            self.first_frame = False
         else:
-            if self.first_frame:
-                dino_rect = self.display_surf.blit(
-                        self.dino_jump,
-                        (self.dino_x, self.dino_y)
-                        )
-                self.first_frame = False
-            else:
-                dino_rect = self.display_surf.blit(
-                        self.dino_dead,
-                        (self.dino_x,self.dino_y)
-                        )
-        dino_rect = pygame.Rect(
-                dino_rect.left + self.COLLISION_FORGIVE,
-                dino_rect.top + self.COLLISION_FORGIVE,
-                dino_rect.width - 2 * self.COLLISION_FORGIVE,
-                dino_rect.height - 2 * self.COLLISION_FORGIVE
-                )
-        #Paint obstacles
-        obstacle_rects = list()
-        closest_obstacle = 0
-        closest_obstacle_distance = None
-        closest_obstacle_heights = [0,0,0,0,0]
-        next_closest_obstacle_distance = None
-        i = 0
-        for obstacle in self.obstacles:
-            if closest_obstacle is not None :
-                obstacle_rect = self.display_surf.blit(
-                        obstacle[0],
-                        (obstacle[1][0], obstacle[1][1])
-                        )
-                obstacle_rect = pygame.Rect(
-                        obstacle_rect.left + self.COLLISION_FORGIVE,
-                        obstacle_rect.top + self.COLLISION_FORGIVE,
-                        obstacle_rect.width - 2 * self.COLLISION_FORGIVE,
-                        obstacle_rect.height - 2 * self.COLLISION_FORGIVE
-                        )
-                if closest_obstacle == 0:
-                    if dino_rect.left <= obstacle_rect.right:
-                        obstacle_rects.append(obstacle_rect)
-                        closest_obstacle = (obstacle_rect.right
-                                            + self.COLLISION_FORGIVE)
-                        closest_obstacle_distance = (obstacle_rect.left
-                                            - dino_rect.right)
-                        closest_obstacle_heights[i] = obstacle_rect.top
-                        previous_top = obstacle_rect.top
-                        i += 1
-                else:
-                    if closest_obstacle == (obstacle_rect.left
-                                            -  self.COLLISION_FORGIVE):
-                        obstacle_rects.append(obstacle_rect)
-                        closest_obstacle += (obstacle_rect.width
-                                            + 2 * self.COLLISION_FORGIVE)
-                        closest_obstacle_heights[i] = max(
-                                obstacle_rect.top,
-                                previous_top
-                                )
-                        previous_top = obstacle_rect.top
-                        i += 1
-                    else:
-                        closest_obstacle = None
-                        closest_obstacle_heights[i] = previous_top
-            else:
-                obstacle_rect = self.display_surf.blit(
-                        obstacle[0],
-                        (obstacle[1][0], obstacle[1][1])
-                        )
-                obstacle_rect = pygame.Rect(
-                        obstacle_rect.left + self.COLLISION_FORGIVE,
-                        obstacle_rect.top + self.COLLISION_FORGIVE,
-                        obstacle_rect.width - 2 * self.COLLISION_FORGIVE,
-                        obstacle_rect.height - 2 * self.COLLISION_FORGIVE
-                        )
-                if next_closest_obstacle_distance is None:
-                    next_closest_obstacle_distance = (
-                            obstacle_rect.left - dino_rect.right
-                            )
-        if next_closest_obstacle_distance is None:
-            next_closest_obstacle_distance = (
-                    self.display_surf.get_width() - dino_rect.right
-                    )
-        if closest_obstacle_distance is None:
-            closest_obstacle_distance = (
-                    self.display_surf.get_width() - dino_rect.right
-                    )
-        # Detect collision
-        for obstacle_rect in obstacle_rects:
-            if dino_rect.colliderect(obstacle_rect):
-                self.playing = False
-                if self.running:
-                    self.running = self.player.keep_playing(int(self.game_time/100))
-                break
-        # Update screen.
-        pygame.display.flip()
-        # Request next move.
+            renderer.draw_dinos(renderer.dino_dead)
+        renderer.draw_obstacles()
+        self.lap("blit")
+        renderer.flip()
+        self.lap("flip")
+
+    def request_actions(self):
+        """Ask the players due for a decision for their next move."""
         if self.playing:
-            state = [
-                    int(self.ground_step),
-                    closest_obstacle_distance,
-                    next_closest_obstacle_distance
-                    ]
-            state.extend(closest_obstacle_heights)
-            next_action = self.player.get_action(state, int(self.game_time/100))
-            if next_action:
-                self.jump()
+            engine = self.engine
+            deciding = engine.deciding(self.decision_interval,
+                                       self.skip_airborne)
+            engine.jump_mask(self.players.decide(
+                    engine.state, engine.score, engine.alive, deciding
+                    ))
 
     def on_cleanup(self):
-        """Close game"""
-        pygame.quit()
-        self.most_recent_score = int(self.game_time/100)
+        """Close game, the window stays open for the next one unless the
+        player closed it."""
+        if self.window_closed:
+            from assets import close_assets
+            close_assets()
+        self.most_recent_score = self.engine.score
 
     def on_execute(self, start_immediately = False):
         """Execute game loop
 
         Keyword arguments:
         start_immediately -- start playing without waiting for player
-                            input (default False)
+                            input, always True for headless games which
+                            cannot receive input (default False)
         """
         #try:
         if self.on_init() == False:
             self.running = False
-        self.playing = start_immediately
+        self.playing = start_immediately or self.headless
+        self.players.reset()
+        if self.stopping is not None:
+            self.stopping.start_game()
+        if not self.headless:
+            import pygame
+        profiler = self.profiler
         while( self.running ):
-            for event in pygame.event.get():
-                self.on_event(event)
+            if profiler is not None:
+                profiler.begin_frame()
+            if not self.headless:
+                for event in pygame.event.get():
+                    self.on_event(event)
+                self.lap("events")
+            self.painting = self.render_due()
             self.on_loop()
-            self.on_render()
-            self.rendered = True
+            if self.painting:
+                self.on_render()
+                self.rendered = True
+            self.request_actions()
+            if profiler is not None:
+                profiler.lap("network")
+                profiler.end_frame()
         self.on_cleanup()
         """
         except Exception as err:
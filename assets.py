@@ -0,0 +1,87 @@
+import os
+
+import pygame
+
+from hud import Text_cache
+
+
+class Dino_assets:
+    """Window, font and sprites of the Dino game.
+
+    Loading and converting the images and looking up the font is slow, so
+    one instance is shared by every game of the process (see get_assets)
+    and the window stays open between games.
+    """
+
+    def __init__(self, size):
+        """Open the main window and load the images.
+
+        Keyword arguments:
+        size -- (width, height) of the window
+        """
+        script_dir = os.path.dirname(__file__)
+        # Initialize the main window, only the display and font modules
+        # are used so the other ones (audio, joystick...) are left off.
+        pygame.display.init()
+        logo = pygame.image.load(os.path.join(script_dir, "images/dino.jpg"))
+        pygame.display.set_icon(logo)
+        pygame.display.set_caption("Dino")
+        self.size = tuple(size)
+        self.display_surf = pygame.display.set_mode(
+                self.size, pygame.HWSURFACE | pygame.DOUBLEBUF
+                )
+        # Initialize the font system.
+        pygame.font.init()
+        self.text_font = pygame.font.SysFont('Comic Sans MS', 20)
+        self.text_cache = Text_cache(self.text_font)
+        self.instuction_up = self.text_cache.render(
+                "Press the UP arrow to jump"
+                )
+        # Load the ground image, it is scrolled by the games.
+        self.ground = self.load_sprite(script_dir, "images/ground.png")
+        #Load the obstacle sprites in the order of engine.OBSTACLE_SIZES.
+        self.possible_obstacles = [
+                self.load_sprite(script_dir, "images/cactus_b_1.png"),
+                self.load_sprite(script_dir, "images/cactus_s_1.png")
+                ]
+        #Load the dinosaur sprites.
+        self.dino_move_1 = self.load_sprite(script_dir,
+                                            "images/dino_move_1.png")
+        self.dino_move_2 = self.load_sprite(script_dir,
+                                            "images/dino_move_2.png")
+        self.dino_jump = self.load_sprite(script_dir, "images/dino_jump.png")
+        self.dino_dead = self.load_sprite(script_dir, "images/dino_dead.png")
+
+    @staticmethod
+    def load_sprite(script_dir, path):
+        """Load an image for fast blitting onto the window."""
+        sprite = pygame.image.load(os.path.join(script_dir, path)).convert()
+        sprite.set_colorkey((64,202,201))
+        return sprite
+
+
+_assets = None
+
+
+def get_assets(size = (640, 400)):
+    """Return the assets of the process, loading them on the first call.
+
+    Keyword arguments:
+    size -- (width, height) of the window (default (640, 400))
+    """
+    global _assets
+    if _assets is None or not pygame.display.get_init():
+        _assets = Dino_assets(size)
+    elif _assets.size != tuple(size):
+        _assets.size = tuple(size)
+        _assets.display_surf = pygame.display.set_mode(
+                _assets.size, pygame.HWSURFACE | pygame.DOUBLEBUF
+                )
+    return _assets
+
+
+def close_assets():
+    """Close the window and release the assets."""
+    global _assets
+    _assets = None
+    pygame.quit()
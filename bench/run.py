@@ -0,0 +1,260 @@
+"""Benchmarks of the simulation, the rendering and the training.
+
+Every workload is seeded so two runs on the same machine measure the same
+games. The results are written to a JSON file, and compared to the file
+of a previous run with --compare to catch the regressions between two
+releases:
+
+    python bench/run.py --output new.json --compare old.json
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+
+# The rendering is measured without a screen.
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+from Dino import Dino, Dino_player_random
+from engine import ENGINE_VERSION, Stopping_rules
+
+
+def result(value, unit, higher_is_better, runs, **details):
+    """Return the entry of a workload in the results.
+
+    Keyword arguments:
+    value -- best measure of the runs
+    unit -- unit of the measure
+    higher_is_better -- True for a throughput, False for a duration
+    runs -- measure of every run
+    details -- extra values describing the workload
+    """
+    entry = {"value": value, "unit": unit,
+             "higher_is_better": higher_is_better, "runs": runs}
+    entry.update(details)
+    return entry
+
+
+def bench_dino_random(repeat, frames = 20000):
+    """Frames per second of headless Dino games with a random player,
+    games are played until frames frames are simulated."""
+    runs = list()
+    for _ in range(repeat):
+        played = 0
+        seed = 0
+        elapsed = 0.0
+        while played < frames:
+            game = Dino(Dino_player_random(seed = seed), seed = seed,
+                        headless = True)
+            start = time.perf_counter()
+            game.on_execute(start_immediately = True)
+            elapsed += time.perf_counter() - start
+            played += game.engine.frame
+            seed += 1
+        runs.append(played / elapsed)
+    return result(max(runs), "frames/s", True, runs, frames = played)
+
+
+def random_networks(size, seed = 0):
+    """Return the compiled networks of a seeded first generation of
+    MultiNEAT genomes."""
+    import MultiNEAT as NEAT
+    from network import compile_network
+    from observation import observation_size
+    params = NEAT.Parameters()
+    params.PopulationSize = size
+    genome = NEAT.Genome(0, observation_size() + 1, 0, 1, False,
+                         NEAT.ActivationFunction.UNSIGNED_SIGMOID,
+                         NEAT.ActivationFunction.UNSIGNED_SIGMOID,
+                         0, params, 0)
+    population = NEAT.Population(genome, params, True, 1.0, seed)
+    networks = list()
+    for genome in NEAT.GetGenomeList(population):
+        network = NEAT.NeuralNetwork()
+        genome.BuildPhenotype(network)
+        networks.append(compile_network(network))
+    return networks
+
+
+def bench_neat_population(repeat, size, frames = 3000, max_frames = 3000):
+    """Frames per second of headless Dino_NEAT generations of size
+    players, games are played until frames frames are simulated and every
+    game is cut after max_frames frames."""
+    from neat import Dino_NEAT, Dino_population_neat
+    networks = random_networks(size)
+    runs = list()
+    for _ in range(repeat):
+        played = 0
+        seed = 0
+        elapsed = 0.0
+        while played < frames:
+            players = Dino_population_neat(networks)
+            game = Dino_NEAT(players, 1, headless = True, seed = seed,
+                             stopping = Stopping_rules(
+                                     max_frames = max_frames
+                                     ))
+            start = time.perf_counter()
+            game.on_execute()
+            elapsed += time.perf_counter() - start
+            played += game.engine.frame
+            seed += 1
+        runs.append(played / elapsed)
+    return result(max(runs), "frames/s", True, runs, players = size,
+                  frames = played)
+
+
+def bench_render(repeat, frames = 600):
+    """Milliseconds spent by Dino.on_render per frame in the dummy video
+    driver, the game is restarted whenever the player dies."""
+    runs = list()
+    for _ in range(repeat):
+        game = Dino(Dino_player_random(seed = 0), seed = 0)
+        game.on_init()
+        game.reinit()
+        durations = list()
+        for _ in range(frames):
+            if not game.playing:
+                game.reinit()
+            # on_loop would wait for the 60 frames per second clock.
+            game.engine.step()
+            game.renderer.scroll()
+            if game.engine.players_alive == 0:
+                game.playing = False
+            start = time.perf_counter()
+            game.on_render()
+            durations.append(time.perf_counter() - start)
+            game.request_actions()
+        runs.append(statistics.median(durations) * 1000)
+    return result(min(runs), "ms/frame", False, runs, frames = frames,
+                  driver = os.environ["SDL_VIDEODRIVER"])
+
+
+def bench_trainer(repeat, generations = 5, population_size = 100,
+                  max_frames = 3000):
+    """Generations per minute of a seeded headless NEAT_trainer, every
+    game is cut after max_frames frames."""
+    from neat import NEAT_trainer
+    runs = list()
+    for _ in range(repeat):
+        trainer = NEAT_trainer(population_size, generations = generations,
+                               headless = True, seed = 0,
+                               stopping = Stopping_rules(
+                                       max_frames = max_frames
+                                       ))
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            trainer.start_cycle()
+        elapsed = time.perf_counter() - start
+        runs.append(generations / elapsed * 60)
+    return result(max(runs), "generations/min", True, runs,
+                  generations = generations,
+                  population_size = population_size)
+
+
+def workloads(quick = False):
+    """Return the dict of name: function(repeat) of every workload, the
+    quick workloads are smaller and skip the biggest population."""
+    sizes = (100, 1000) if quick else (100, 1000, 10000)
+    benchmarks = {
+            "dino_random": lambda repeat: bench_dino_random(
+                    repeat, 5000 if quick else 20000
+                    ),
+            }
+    for size in sizes:
+        benchmarks["neat_population_" + str(size)] = (
+                lambda repeat, size = size: bench_neat_population(
+                        repeat, size, 1000 if quick else 3000
+                        ))
+    benchmarks["render"] = lambda repeat: bench_render(
+            repeat, 200 if quick else 600
+            )
+    benchmarks["trainer"] = lambda repeat: bench_trainer(
+            repeat, 2 if quick else 5
+            )
+    return benchmarks
+
+
+def run(names = None, repeat = 3, quick = False):
+    """Run the workloads and return the results.
+
+    A workload whose dependencies are not installed (MultiNEAT for the
+    NEAT workloads, pygame for the rendering) is reported as skipped.
+
+    Keyword arguments:
+    names -- names of the workloads to run (default None, all of them)
+    repeat -- number of runs of every workload, the best one is kept
+              (default 3)
+    quick -- run smaller workloads (default False)
+    """
+    results = dict()
+    for name, bench in workloads(quick).items():
+        if names is not None and name not in names:
+            continue
+        print(name, end = " : ", flush = True)
+        try:
+            results[name] = bench(repeat)
+        except ImportError as err:
+            results[name] = {"skipped": str(err)}
+            print("skipped,", err)
+            continue
+        print(f"{results[name]['value']:.2f} {results[name]['unit']}")
+    return {"engine_version": ENGINE_VERSION,
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+            "date": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "repeat": repeat, "quick": quick,
+            "results": results}
+
+
+def compare(results, previous, tolerance = 0.1):
+    """Print the change of every workload since a previous run and return
+    the names of the workloads slower by more than tolerance."""
+    regressions = list()
+    for name, entry in results["results"].items():
+        old = previous["results"].get(name)
+        if "value" not in entry or old is None or "value" not in old:
+            continue
+        ratio = entry["value"] / old["value"]
+        if not entry["higher_is_better"]:
+            ratio = 1 / ratio
+        print(f"  {name:<24}{old['value']:12.2f} -> {entry['value']:12.2f}"
+              f" {entry['unit']:<16}{(ratio - 1) * 100:+7.1f} %")
+        if ratio < 1 - tolerance:
+            regressions.append(name)
+    return regressions
+
+
+if __name__ == "__main__" :
+    parser = argparse.ArgumentParser(description = __doc__.splitlines()[0])
+    parser.add_argument("--output", "-o", default = "benchmarks.json",
+                        help = "JSON file of the results")
+    parser.add_argument("--compare", "-c",
+                        help = "JSON file of a previous run")
+    parser.add_argument("--tolerance", type = float, default = 0.1,
+                        help = "slowdown reported as a regression")
+    parser.add_argument("--repeat", "-r", type = int, default = 3)
+    parser.add_argument("--quick", "-q", action = "store_true",
+                        help = "smaller workloads")
+    parser.add_argument("names", nargs = "*",
+                        help = "workloads to run (default all)")
+    arguments = parser.parse_args()
+    results = run(arguments.names or None, arguments.repeat, arguments.quick)
+    with open(arguments.output, "w") as output_file:
+        json.dump(results, output_file, indent = 2)
+    print("Saved in", arguments.output)
+    if arguments.compare is not None:
+        with open(arguments.compare) as previous_file:
+            regressions = compare(results, json.load(previous_file),
+                                  arguments.tolerance)
+        if regressions:
+            print("Regressions :", ", ".join(regressions))
+            sys.exit(1)
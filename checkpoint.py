@@ -0,0 +1,81 @@
+import os
+import shutil
+
+
+def _sync(path):
+    """Flush a file written by another library to the disk."""
+    with open(path, "rb") as written_file:
+        os.fsync(written_file.fileno())
+
+
+def write_checkpoint(directory, generation, writers, keep = 2):
+    """Write the files of a checkpoint atomically and return its path.
+
+    The files are written in a temporary directory which is renamed once
+    complete, then the "latest" file is replaced to point to it, so an
+    interrupted save always leaves the previous checkpoint usable.
+
+    Keyword arguments:
+    directory -- directory of the checkpoints
+    generation -- generation of the checkpoint, used in its name
+    writers -- dict of file name: function(path) writing the file
+    keep -- number of checkpoints kept, the oldest ones are deleted
+            (default 2)
+    """
+    os.makedirs(directory, exist_ok = True)
+    name = "generation_%05d" % generation
+    target = os.path.join(directory, name)
+    temporary = target + ".tmp"
+    shutil.rmtree(temporary, ignore_errors = True)
+    os.makedirs(temporary)
+    for file_name, write in writers.items():
+        path = os.path.join(temporary, file_name)
+        write(path)
+        _sync(path)
+    # A checkpoint of the same generation is moved aside rather than
+    # deleted, so there is always a complete copy on the disk.
+    previous = target + ".old"
+    shutil.rmtree(previous, ignore_errors = True)
+    if os.path.exists(target):
+        os.replace(target, previous)
+    os.replace(temporary, target)
+    latest = os.path.join(directory, "latest")
+    with open(latest + ".tmp", "w") as latest_file:
+        latest_file.write(name)
+        latest_file.flush()
+        os.fsync(latest_file.fileno())
+    os.replace(latest + ".tmp", latest)
+    shutil.rmtree(previous, ignore_errors = True)
+    # Delete the oldest checkpoints.
+    checkpoints = sorted(entry for entry in os.listdir(directory)
+                         if entry.startswith("generation_")
+                         and not entry.endswith((".tmp", ".old")))
+    for entry in checkpoints[:-keep]:
+        shutil.rmtree(os.path.join(directory, entry), ignore_errors = True)
+    return target
+
+
+def latest_checkpoint(directory):
+    """Return the path of the latest complete checkpoint of a directory,
+    None if there is none.
+
+    If the save was interrupted before the "latest" file was replaced, or
+    while a checkpoint was replaced, the newest complete checkpoint left
+    on the disk is returned.
+    """
+    latest = os.path.join(directory, "latest")
+    if os.path.exists(latest):
+        with open(latest) as latest_file:
+            path = os.path.join(directory, latest_file.read().strip())
+        if os.path.isdir(path):
+            return path
+    if not os.path.isdir(directory):
+        return None
+    # Complete checkpoints, the ones moved aside included.
+    checkpoints = sorted(entry for entry in os.listdir(directory)
+                         if entry.startswith("generation_")
+                         and not entry.endswith(".tmp")
+                         and os.path.isdir(os.path.join(directory, entry)))
+    if not checkpoints:
+        return None
+    return os.path.join(directory, checkpoints[-1])
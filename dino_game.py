@@ -1,108 +1,125 @@
-import sys
+import argparse
+import os
+import time
 
-from dino import Dino, Dino_player, Dino_player_random
-from neat import NEAT_trainer
 
+def verify_arguments(argv = None):
+    """Parse the command line and return a dict of the options given, in
+    any order. Exit with the usage if they are not valid.
 
-def verify_arguments():
-    arguments = dict()
-    player_types = ["human", "random", "neat"]
-    if len(sys.argv) == 1:
-        return arguments
-    for i, arg in enumerate(sys.argv):
-        if arg == "--type" or arg == "-t":
-            if i+1<len(sys.argv) and not "type" in arguments:
-                arguments["type"] = sys.argv[i+1]
-                del sys.argv[i]
-                del sys.argv[i]
-                if arguments["type"] not in player_types:
-                    return None
-                elif arguments["type"] != "neat":
-                    break
-                if i < len(sys.argv):
-                    arg=sys.argv[i]
-                else:
-                    break
-            else:
-                return None
-        if "type" in arguments:
-            if arg == "--population" or arg == "-p":
-                if i+1 < len(sys.argv) and not "population" in arguments:
-                    try:
-                        arguments["population"] = int(sys.argv[i+1])
-                    except TypeError:
-                        return None
-                    del sys.argv[i]
-                    del sys.argv[i]
-                    if i < len(sys.argv):
-                        arg=sys.argv[i]
-                    else:
-                        break
-                else:
-                    return None
-            if arg == "--generations" or arg == "-g":
-                if i+1 < len(sys.argv) and not "generations" in arguments:
-                    try:
-                        arguments["generations"] = int(sys.argv[i+1])
-                    except TypeError:
-                        return None
-                    del sys.argv[i]
-                    del sys.argv[i]
-                    if i < len(sys.argv):
-                        arg = sys.argv[i]
-                    else:
-                        break
-                else:
-                    return None
-            if arg == "--population" or arg == "-p":
-                if i+1 < len(sys.argv) and not "population" in arguments:
-                    try:
-                        arguments["population"] = int(sys.argv[i+1])
-                    except TypeError:
-                        return None
-                    del sys.argv[i]
-                    del sys.argv[i]
-                    if i < len(sys.argv):
-                        arg=sys.argv[i]
-                    else:
-                        break
-                else:
-                    return None
-    if len(arguments) != 0 and len(sys.argv) == 1:
-        return arguments
-    else:
-        return None
-
-
-if __name__ == "__main__" :
-    arguments = verify_arguments()
-    if arguments is None:
-        print(f'Usage: python {sys.argv[0]} [ --type (human|random|neat \
-                       [--population <size>] [--generations <size>]) ] ')
-    elif "type" in arguments:
-        if arguments["type"] == "human":
-            player = Dino_player()
-            theDino = Dino(player)
-            theDino.on_execute()
-        elif arguments["type"] == "random":
-            player = Dino_player_random()
-            theDino = Dino(player)
-            theDino.on_execute()
-        else:
-            data = dict()
-            if "population" in arguments:
-                data["population_size"] = arguments["population"]
-            if "generations" in arguments:
-                data["generations"] = arguments["generations"]
-            cycle = NEAT_trainer(**data)
-            cycle.start_cycle()
-    else:
-        player = Dino_player()
-        theDino = Dino(player)
-        theDino.on_execute()
+    Keyword arguments:
+    argv -- arguments to parse (default None, sys.argv)
+    """
+    parser = argparse.ArgumentParser(
+            description = "Play the Dino game or train a bot to play it."
+            )
+    parser.add_argument("--type", "-t", default = argparse.SUPPRESS,
+                        choices = ["human", "random", "neat", "compiled"],
+                        help = "type of the player (default human)")
+    parser.add_argument("--population", "-p", type = int,
+                        default = argparse.SUPPRESS,
+                        help = "number of genomes in a population (neat)")
+    parser.add_argument("--generations", "-g", type = int,
+                        default = argparse.SUPPRESS,
+                        help = "number of generations to train (neat)")
+    parser.add_argument("--checkpoint", "-c", default = argparse.SUPPRESS,
+                        help = "directory where the training is saved "
+                               "(neat)")
+    parser.add_argument("--resume", "-r", default = argparse.SUPPRESS,
+                        help = "directory of a saved training to continue "
+                               "(neat)")
+    parser.add_argument("--network", "-n", default = argparse.SUPPRESS,
+                        help = "file the best genome is exported to (neat) "
+                               "or played from (compiled, default "
+                               "champion.npz)")
+    parser.add_argument("--profile-startup", action = "store_true",
+                        help = "print the time taken to start the game "
+                               "and exit")
+    arguments = vars(parser.parse_args(argv))
+    player_type = arguments.get("type", "human")
+    for option in ("population", "generations", "checkpoint", "resume"):
+        if option in arguments and player_type != "neat":
+            parser.error("--" + option + " needs --type neat")
+    if "network" in arguments and player_type not in ("neat", "compiled"):
+        parser.error("--network needs --type neat or compiled")
+    if player_type == "compiled":
+        network = arguments.get("network", "champion.npz")
+        if not os.path.isfile(network):
+            parser.error("no network file " + network + ", export one "
+                         "with --type neat --network " + network)
+    return arguments
 
 
+def create_game(arguments):
+    """Import the modules needed by the arguments and return the game to
+    run, a Dino game or a NEAT_trainer. MultiNEAT is only imported to
+    train."""
+    player_type = arguments.get("type", "human")
+    if player_type == "neat":
+        from neat import NEAT_trainer
+        data = dict()
+        if "population" in arguments:
+            data["population_size"] = arguments["population"]
+        if "generations" in arguments:
+            data["generations"] = arguments["generations"]
+        if "checkpoint" in arguments:
+            data["checkpoint_dir"] = arguments["checkpoint"]
+        if "resume" in arguments:
+            data.setdefault("checkpoint_dir", arguments["resume"])
+        cycle = NEAT_trainer(**data)
+        if "resume" in arguments:
+            cycle.load_checkpoint(arguments["resume"])
+        return cycle
+    from Dino import Dino, Dino_player, Dino_player_compiled, \
+            Dino_player_random
+    if player_type == "random":
+        return Dino(Dino_player_random())
+    if player_type == "compiled":
+        player = Dino_player_compiled(arguments.get("network", "champion.npz"))
+        return Dino(player, features = player.features,
+                    feature_offset = player.feature_offset,
+                    feature_scale = player.feature_scale)
+    return Dino(Dino_player())
 
 
+def profile_startup(arguments):
+    """Start the game selected by the arguments up to its first frame and
+    print the time taken by every phase."""
+    phases = list()
+    start = time.perf_counter()
+    def mark(phase):
+        phases.append((phase, time.perf_counter()))
+    import Dino
+    if arguments.get("type") == "neat":
+        import neat
+    mark("imports")
+    game = create_game(arguments)
+    mark("setup")
+    from assets import get_assets
+    get_assets()
+    mark("window and sprites")
+    if hasattr(game, "on_render"):
+        game.on_init()
+        game.playing = True
+        game.on_loop()
+        game.on_render()
+        mark("first frame")
+    print("startup profile :")
+    previous = start
+    for phase, end in phases:
+        print(f"  {phase:<20}{(end - previous) * 1000:8.1f} ms")
+        previous = end
+    print(f"  {'total':<20}{(previous - start) * 1000:8.1f} ms")
 
 
+if __name__ == "__main__" :
+    arguments = verify_arguments()
+    if arguments.pop("profile_startup"):
+        profile_startup(arguments)
+    elif arguments.get("type") == "neat":
+        cycle = create_game(arguments)
+        cycle.start_cycle()
+        if "network" in arguments and cycle.best_genome is not None:
+            cycle.export_champion(arguments["network"])
+    else:
+        create_game(arguments).on_execute()
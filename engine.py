@@ -0,0 +1,638 @@
+import copy
+import random
+import time
+from collections import deque
+
+import numpy as np
+
+from observation import DEFAULT_FEATURES, Observation
+
+
+# Bump when a change of the rules changes the scores, cached scores of
+# older versions are then ignored.
+ENGINE_VERSION = 1
+FIXED_DT = 1000 / 60
+OBSTACLE_SIZES = ((23, 49), (15, 33))
+
+
+class Obstacle_course:
+    """Obstacles of a whole game generated from a seed.
+
+    Every obstacle is a row of the int64 array `obstacles`: its position on
+    the ground (SPAWN_X, the screen x is SPAWN_X minus the distance run so
+    far), its WIDTH and HEIGHT, its KIND and the FRAME it appears at. The
+    rows are generated lazily, a chunk of frames at a time, with the same
+    draws the game used to make every frame, so a course only depends on
+    its seed and can be shared by every engine playing that seed.
+    """
+
+    SPAWN_X, WIDTH, HEIGHT, KIND, FRAME = range(5)
+    CHUNK = 600
+
+    def __init__(self, seed = None, dt = FIXED_DT,
+                 obstacle_sizes = OBSTACLE_SIZES, screen_width = 640,
+                 ground_speed = 6):
+        """Initialize the generator.
+
+        Keyword arguments:
+        seed -- seed of the obstacles (default None, a random course)
+        dt -- duration of a frame in milliseconds (default 1000/60)
+        obstacle_sizes -- (width, height) of every kind of obstacle
+        screen_width -- x at which the obstacles appear (default 640)
+        ground_speed -- initial ground step in pixels (default 6)
+        """
+        self.seed = seed
+        self.dt = dt
+        self.obstacle_sizes = [tuple(size) for size in obstacle_sizes]
+        self.screen_width = screen_width
+        self.ground_speed = ground_speed
+        self.rng = random.Random(seed)
+        self.frames = 0
+        self.game_time = 0
+        self.distance = 0
+        self.obstacle_distance = 0
+        self.obstacles = np.zeros((0, 5), dtype=np.int64)
+
+    def __len__(self):
+        return len(self.obstacles)
+
+    def generate(self, frames):
+        """Make sure the obstacles of the first frames are generated."""
+        rows = list()
+        while self.frames < frames:
+            self.frames += 1
+            self.game_time += self.dt
+            step = int(self.ground_speed
+                       * ( 0.125*(self.game_time//10000) + 1))
+            self.obstacle_distance += step
+            if 300 < self.obstacle_distance <= 900:
+                generate_obstacles = self.rng.uniform(0,1) < 0.05
+            else:
+                generate_obstacles = 900 < self.obstacle_distance
+            if generate_obstacles:
+                number_obstacles = self.rng.randint(1,4)
+                last_x = self.distance + self.screen_width
+                for i in range(number_obstacles):
+                    kind = self.rng.choice(range(len(self.obstacle_sizes)))
+                    width, height = self.obstacle_sizes[kind]
+                    rows.append((last_x, width, height, kind, self.frames))
+                    last_x += width
+                self.obstacle_distance = 0
+            self.distance += step
+        if rows:
+            self.obstacles = np.concatenate(
+                    (self.obstacles, np.array(rows, dtype=np.int64))
+                    )
+
+
+class Dino_engine:
+    """Headless simulation core of the Dino game.
+
+    The engine advances the physics of one or more dinosaurs with a fixed
+    time step and never calls pygame, so it can run as fast as the CPU
+    allows. Renderers only read its attributes to paint the current frame.
+
+    The players are stored as a structure of NumPy arrays (dino_y,
+    jumping_a, jumping_d, alive, fitness) so that a whole population is
+    moved and tested for collisions with a few array operations per frame.
+
+    The obstacles on the screen are kept in a deque ordered by x. Their
+    sprite position and vertical hitbox are computed once when they appear
+    and they are popped from the left once they leave the screen.
+    """
+
+    def __init__(self, n_players = 1, dt = FIXED_DT, dino_size = (40, 43),
+                 obstacle_sizes = OBSTACLE_SIZES, seed = None, course = None,
+                 features = DEFAULT_FEATURES, observation = None):
+        """Initialize the variables and declare constants.
+
+        Keyword arguments:
+        n_players -- number of dinosaurs running in the game (default 1)
+        dt -- duration of a frame in milliseconds (default 1000/60)
+        dino_size -- (width, height) of the dinosaur sprites
+        obstacle_sizes -- (width, height) of every kind of obstacle
+        seed -- seed of the obstacles, the same seed always gives the same
+                game (default None, a new random game at every reset)
+        course -- Obstacle_course to play, shared with other engines
+                  (default None, generate one from seed at every reset)
+        features -- features of the state, see observation.FEATURES
+                    (default DEFAULT_FEATURES)
+        observation -- Observation the state is written into, replaces
+                       features (default None, a new one without
+                       normalization)
+        """
+        # Declare constants.
+        self.SIZE = self.WEIGHT, self.HEIGHT = 640, 400
+        self.DINO_INITIAL_X = 100
+        self.DINO_INITIAL_Y = 250
+        self.MAX_JUMP_HEIGHT = 100
+        self.JUMP_SPEED_A = 0.5
+        self.JUMP_SPEED_D = 0.5
+        self.DINO_MOVE_SPEED = 0.1
+        self.GROUND_INITIAL_SPEED = 6
+        self.COLLISION_FORGIVE = 8
+        # Initialize rest of variables.
+        self.n_players = n_players
+        self.dt = dt
+        self.dino_size = tuple(dino_size)
+        self.obstacle_sizes = [tuple(size) for size in obstacle_sizes]
+        self.seed = seed
+        self.shared_course = course
+        if observation is None:
+            observation = Observation(features, n_players)
+        self.observation = observation
+        # Frame_profiler timing the phases of step, set by the games.
+        self.profiler = None
+        if course is not None:
+            assert course.dt == dt and course.obstacle_sizes == \
+                    self.obstacle_sizes
+        self.reset()
+
+    def reset(self):
+        """Reinitialize the flags and variables."""
+        self.course = self.shared_course
+        if self.course is None:
+            self.course = Obstacle_course(self.seed, self.dt,
+                                          self.obstacle_sizes, self.WEIGHT,
+                                          self.GROUND_INITIAL_SPEED)
+        self.dino_x = self.DINO_INITIAL_X
+        self.dino_y = np.full(self.n_players, self.DINO_INITIAL_Y,
+                              dtype=np.float64)
+        self.jumping_a = np.zeros(self.n_players, dtype=bool)
+        self.jumping_d = np.zeros(self.n_players, dtype=bool)
+        self.alive = np.ones(self.n_players, dtype=bool)
+        self.fitness = np.zeros(self.n_players, dtype=np.int64)
+        self.obstacle_queue = deque()
+        self.next_obstacle = 0
+        self.closest_obstacle = 0
+        self.distance = 0
+        self.move_counter = 0
+        self.game_time = 0
+        self.frame = 0
+        self.ground_step = self.GROUND_INITIAL_SPEED
+        self.state = None
+        self.closest_obstacle_distance = 0
+        self.next_obstacle_distance = 0
+        self.closest_obstacle_heights = np.zeros(5, dtype=np.int64)
+        # The dinosaurs never leave the screen, their box only moves up.
+        self.dino_box = self._hitbox(self.dino_x, self.DINO_INITIAL_Y,
+                                     *self.dino_size)
+
+    @property
+    def score(self):
+        """Current score of the game."""
+        return int(self.game_time/100)
+
+    @property
+    def obstacles(self):
+        """(kind, x, y) of the obstacles on the screen."""
+        return [(obstacle[2], obstacle[0] - self.distance, obstacle[3])
+                for obstacle in self.obstacle_queue]
+
+    @property
+    def players_alive(self):
+        """Number of dinosaurs still running."""
+        return int(np.count_nonzero(self.alive))
+
+    def jump(self, player):
+        """Trigger jumping event for a player if possible."""
+        if self.alive[player] and not(self.jumping_a[player]
+                                      or self.jumping_d[player]):
+            self.jumping_a[player] = True
+
+    def jump_mask(self, actions):
+        """Trigger jumping event for every player flagged in actions."""
+        start = (np.asarray(actions, dtype=bool) & self.alive
+                 & ~(self.jumping_a | self.jumping_d))
+        self.jumping_a |= start
+
+    def finish(self):
+        """End the game now, the players still alive get the current score
+        as fitness."""
+        self.fitness[self.alive] = self.score
+        self.alive[:] = False
+
+    def deciding(self, interval = 1, skip_airborne = False):
+        """Return the mask of the players to ask for a move this frame.
+
+        A jump cannot be interrupted, so the players only need to decide
+        every few frames and never while they are in the air.
+
+        Keyword arguments:
+        interval -- ask the players every interval frames (default 1)
+        skip_airborne -- do not ask the players who are jumping
+                         (default False)
+        """
+        if (self.frame - 1) % interval != 0:
+            return np.zeros_like(self.alive)
+        if skip_airborne:
+            return self.alive & ~(self.jumping_a | self.jumping_d)
+        return self.alive.copy()
+
+    def step(self, actions = None):
+        """Advance the game by one frame and return (state, alive, score).
+
+        Keyword arguments:
+        actions -- one jump flag per player, applied before moving
+                   (default None, nobody jumps)
+        """
+        if actions is not None:
+            self.jump_mask(actions)
+        self.game_time += self.dt
+        self.frame += 1
+        profiler = self.profiler
+        self._move_dinos()
+        if profiler is not None:
+            profiler.lap("physics")
+        self._move_obstacles()
+        if profiler is not None:
+            profiler.lap("obstacles")
+        self._observe()
+        if profiler is not None:
+            profiler.lap("collision")
+        self.state = self.observation.state
+        return self.state, self.alive, self.score
+
+    def _move_dinos(self):
+        """Update dinosaur locations if jumping."""
+        dt = self.dt
+        top = self.DINO_INITIAL_Y - self.MAX_JUMP_HEIGHT
+        slow_down = self.DINO_INITIAL_Y - self.MAX_JUMP_HEIGHT/1.5
+        y = self.dino_y
+        # Going up: slow down near the top and start falling once there.
+        rising = self.alive & self.jumping_a
+        at_top = rising & (y <= top)
+        slow = rising & ~at_top & (y <= slow_down)
+        y -= np.where(slow, self.JUMP_SPEED_A*dt/2, 0.0)
+        y -= np.where(rising & ~at_top & ~slow, self.JUMP_SPEED_A*dt, 0.0)
+        self.jumping_a &= ~at_top
+        self.jumping_d |= at_top
+        # Going down: slow near the top and land on the ground.
+        falling = self.alive & self.jumping_d
+        landed = falling & (y >= self.DINO_INITIAL_Y)
+        slow = falling & ~landed & (y <= slow_down)
+        y += np.where(slow, self.JUMP_SPEED_D*dt/2, 0.0)
+        y += np.where(falling & ~landed & ~slow, self.JUMP_SPEED_D*dt, 0.0)
+        y[landed] = self.DINO_INITIAL_Y
+        self.jumping_d &= ~landed
+        #Update dinosaur movement animaton
+        self.move_counter += self.DINO_MOVE_SPEED
+        if self.move_counter >= 10:
+            self.move_counter = 0
+
+    def _move_obstacles(self):
+        """Update the ground speed and the queue of obstacles on screen."""
+        self.ground_step = (
+                self.GROUND_INITIAL_SPEED
+                * ( 0.125*(self.game_time//10000) + 1)
+                )
+        self.distance += int(self.ground_step)
+        course = self.course
+        if course.frames < self.frame:
+            if self.profiler is not None:
+                self.profiler.lap("obstacles")
+            course.generate(self.frame + course.CHUNK)
+            if self.profiler is not None:
+                self.profiler.lap("generation")
+        obstacles = course.obstacles
+        queue = self.obstacle_queue
+        # Obstacles are ordered by position, so the ones appearing are
+        # pushed on the right and the ones leaving popped from the left.
+        while (self.next_obstacle < len(obstacles) and
+               obstacles[self.next_obstacle, course.FRAME] <= self.frame):
+            queue.append(self._spawn(obstacles[self.next_obstacle]))
+            self.next_obstacle += 1
+        while queue and queue[0][0] + queue[0][1] <= self.distance:
+            queue.popleft()
+            self.closest_obstacle = max(self.closest_obstacle - 1, 0)
+
+    def upcoming_clusters(self, count):
+        """Return (left, right, height) on the screen of the next count
+        clusters of touching obstacles not passed by the dinosaurs yet."""
+        ground = self.DINO_INITIAL_Y + self.dino_size[1]
+        queue = self.obstacle_queue
+        clusters = list()
+        for i in range(self.closest_obstacle, len(queue)):
+            x, width, kind, y = queue[i][:4]
+            left = x - self.distance
+            if clusters and clusters[-1][1] == left:
+                cluster_left, right, height = clusters[-1]
+                clusters[-1] = (cluster_left, left + width,
+                                max(height, ground - y))
+            elif len(clusters) == count:
+                break
+            else:
+                clusters.append((left, left + width, ground - y))
+        return clusters
+
+    def _spawn(self, row):
+        """Return the queue entry of an obstacle row of the course:
+        (x on the ground, width, kind, sprite y, box top, box height).
+
+        The obstacles only move horizontally, so the vertical part of
+        their hitbox is computed once here.
+        """
+        course = self.course
+        x, width, height, kind = row[[course.SPAWN_X, course.WIDTH,
+                                      course.HEIGHT, course.KIND]].tolist()
+        y = self.DINO_INITIAL_Y + self.dino_size[1] - height
+        top, bottom = max(y, 0), min(y + height, self.HEIGHT)
+        if bottom <= top:
+            box_height = None
+        else:
+            box_height = bottom - top - 2 * self.COLLISION_FORGIVE
+        return (x, width, kind, y, top + self.COLLISION_FORGIVE, box_height)
+
+    def _obstacle_box(self, obstacle):
+        """Return the collision box of an obstacle of the queue, clipped
+        to the screen like _hitbox."""
+        x = obstacle[0] - self.distance
+        left = max(x, 0)
+        right = min(x + obstacle[1], self.WEIGHT)
+        if right <= left or obstacle[5] is None:
+            return (left + self.COLLISION_FORGIVE, obstacle[4],
+                    -2 * self.COLLISION_FORGIVE, -2 * self.COLLISION_FORGIVE)
+        return (left + self.COLLISION_FORGIVE, obstacle[4],
+                right - left - 2 * self.COLLISION_FORGIVE, obstacle[5])
+
+    def _hitbox(self, x, y, width, height):
+        """Return the collision box of a sprite painted at (x, y).
+
+        The box is clipped to the screen the same way pygame clips a blit
+        and then shrunk by COLLISION_FORGIVE on every side.
+        """
+        left, top = max(int(x), 0), max(int(y), 0)
+        right = min(int(x) + width, self.WEIGHT)
+        bottom = min(int(y) + height, self.HEIGHT)
+        if right <= left or bottom <= top:
+            width = height = 0
+        else:
+            width, height = right - left, bottom - top
+        return (left + self.COLLISION_FORGIVE,
+                top + self.COLLISION_FORGIVE,
+                width - 2 * self.COLLISION_FORGIVE,
+                height - 2 * self.COLLISION_FORGIVE)
+
+    def _observe(self):
+        """Detect collisions and write the state of the game into the
+        observation buffer.
+
+        The closest cluster of obstacles gives the default features:
+        the distance to the cluster, the distance to the next one and the
+        heights of the cluster (5 values). The right side of an obstacle
+        box never moves right, so the first obstacle not yet passed by the
+        dinosaurs (closest_obstacle) only moves forward in the queue.
+        """
+        dino_left, dino_top, dino_w, dino_box_height = self.dino_box
+        dino_right = dino_left + dino_w
+        queue = self.obstacle_queue
+        closest = self.closest_obstacle
+        while closest < len(queue):
+            box = self._obstacle_box(queue[closest])
+            if dino_left <= box[0] + box[2]:
+                break
+            closest += 1
+        self.closest_obstacle = closest
+        closest_obstacle_heights = self.closest_obstacle_heights
+        closest_obstacle_heights[:] = 0
+        obstacle_boxes = list()
+        closest_obstacle_distance = self.WEIGHT - dino_right
+        next_closest_obstacle_distance = self.WEIGHT - dino_right
+        if closest < len(queue):
+            # The cluster goes on while the obstacles touch each other.
+            obstacle_boxes.append(box)
+            cluster_right = box[0] + box[2] + self.COLLISION_FORGIVE
+            closest_obstacle_distance = box[0] - dino_right
+            closest_obstacle_heights[0] = previous_top = box[1]
+            for i in range(closest + 1, len(queue)):
+                box = self._obstacle_box(queue[i])
+                if cluster_right != box[0] - self.COLLISION_FORGIVE:
+                    closest_obstacle_heights[len(obstacle_boxes)] = \
+                            previous_top
+                    # The next distance is measured to the obstacle after
+                    # the first one out of the cluster.
+                    if i + 1 < len(queue):
+                        box = self._obstacle_box(queue[i + 1])
+                        next_closest_obstacle_distance = box[0] - dino_right
+                    break
+                cluster_right += box[2] + 2 * self.COLLISION_FORGIVE
+                closest_obstacle_heights[len(obstacle_boxes)] = max(
+                        box[1], previous_top
+                        )
+                previous_top = box[1]
+                obstacle_boxes.append(box)
+        # Detect collision. The dinosaurs only differ by the top of their
+        # box which is tested as one array.
+        dino_tops = self.dino_y.astype(np.int64) + self.COLLISION_FORGIVE
+        hit = np.zeros(self.n_players, dtype=bool)
+        for box in obstacle_boxes:
+            if 0 in (box[2], box[3]) or dino_box_height <= 0:
+                continue
+            box_x = sorted((box[0], box[0] + box[2]))
+            box_y = sorted((box[1], box[1] + box[3]))
+            if dino_left < box_x[1] and dino_right > box_x[0]:
+                hit |= ((dino_tops < box_y[1])
+                        & (dino_tops + dino_box_height > box_y[0]))
+        hit &= self.alive
+        self.alive &= ~hit
+        self.fitness[hit] = self.score
+        self.closest_obstacle_distance = closest_obstacle_distance
+        self.next_obstacle_distance = next_closest_obstacle_distance
+        self.observation.update(self)
+
+
+class Stopping_rules:
+    """Conditions ending a game before every player is dead.
+
+    Good players can survive for a very long time, the rules bound the
+    length of a game. Every rule left to None is disabled.
+
+    The time budget is shared by every game checked against the rules
+    until start() is called again, so a trainer can bound a whole
+    generation. The deadline is a wall clock time, which keeps it valid in
+    the copies sent to worker processes. Games played one after the other
+    share the budget through split(), every game then gets its own part.
+
+    top_k compares the players of one game, so it only bounds games where
+    the players compete together.
+    """
+
+    def __init__(self, max_score = None, max_frames = None, top_k = None,
+                 top_k_score = 0, time_budget = None):
+        """Initialize the rules.
+
+        Keyword arguments:
+        max_score -- stop once the score reaches max_score (default None)
+        max_frames -- stop after max_frames frames (default None)
+        top_k -- stop once top_k players are still alive with a score of
+                 at least top_k_score (default None)
+        top_k_score -- score needed by the top_k players (default 0)
+        time_budget -- stop time_budget seconds after start() (default
+                       None)
+        """
+        self.max_score = max_score
+        self.max_frames = max_frames
+        self.top_k = top_k
+        self.top_k_score = top_k_score
+        self.time_budget = time_budget
+        # True when every game starts its own clock, see split.
+        self.per_game = False
+        self.start()
+
+    def split(self, count):
+        """Return a copy of the rules giving each of count games played
+        one after the other an equal part of the time budget, counted
+        from the start of the game.
+
+        Keyword arguments:
+        count -- number of games sharing the budget
+        """
+        rules = copy.copy(self)
+        if self.time_budget is not None:
+            rules.time_budget = self.time_budget / max(count, 1)
+            rules.per_game = True
+            rules.start()
+        return rules
+
+    def start_game(self):
+        """Called by the games when they start, restart the clock of the
+        rules returned by split."""
+        if self.per_game:
+            self.start()
+
+    def start(self):
+        """Start the clock of the time budget, the games only restart it
+        for split rules."""
+        self.deadline = None
+        if self.time_budget is not None:
+            self.deadline = time.time() + self.time_budget
+
+    def should_stop(self, engine):
+        """Return True if the game of the engine must end now.
+
+        Keyword arguments:
+        engine -- Dino_engine of the game
+        """
+        if self.max_score is not None and engine.score >= self.max_score:
+            return True
+        if self.max_frames is not None and engine.frame >= self.max_frames:
+            return True
+        if (self.top_k is not None and engine.score >= self.top_k_score
+                and engine.players_alive >= self.top_k):
+            return True
+        if self.deadline is not None and time.time() >= self.deadline:
+            return True
+        return False
+
+
+class Episode_batch:
+    """Several episodes of the same players simulated in lockstep.
+
+    Every episode is a Dino_engine with its own obstacle course. The
+    alive masks and fitness values of the episodes are stacked, and every
+    engine writes its state into a slice of one (episodes, ...) buffer, so
+    a batched policy can decide the moves of every player in every episode
+    with one call per frame.
+    """
+
+    def __init__(self, n_players, courses, features = DEFAULT_FEATURES,
+                 feature_offset = None, feature_scale = None, **engine_args):
+        """Create one engine per course.
+
+        Keyword arguments:
+        n_players -- number of dinosaurs running in each episode
+        courses -- Obstacle_course, or seed of the obstacles, of every
+                   episode
+        features -- features of the states (default DEFAULT_FEATURES)
+        feature_offset -- offset of the features, see Observation
+                          (default None)
+        feature_scale -- scale of the features, see Observation
+                         (default None)
+        engine_args -- extra arguments given to every Dino_engine
+        """
+        courses = list(courses)
+        shape = Observation(features, n_players).shape
+        self.buffer = np.zeros((len(courses),) + shape)
+        self.states = self.buffer[..., :shape[-1] - 1].view()
+        self.states.flags.writeable = False
+        self.engines = list()
+        for course, buffer in zip(courses, self.buffer):
+            observation = Observation(features, n_players, buffer,
+                                      feature_offset, feature_scale)
+            if isinstance(course, Obstacle_course):
+                engine = Dino_engine(n_players, course = course,
+                                     observation = observation,
+                                     **engine_args)
+            else:
+                engine = Dino_engine(n_players, seed = course,
+                                     observation = observation,
+                                     **engine_args)
+            self.engines.append(engine)
+
+    def __len__(self):
+        return len(self.engines)
+
+    @property
+    def alive(self):
+        """(episodes, players) mask of the dinosaurs still running."""
+        return np.stack([engine.alive for engine in self.engines])
+
+    @property
+    def fitness(self):
+        """(episodes, players) scores of the dinosaurs."""
+        return np.stack([engine.fitness for engine in self.engines])
+
+    @property
+    def players_alive(self):
+        """Number of dinosaurs still running in all the episodes."""
+        return sum(engine.players_alive for engine in self.engines)
+
+    def stop(self, rules):
+        """End the unfinished episodes stopped by the rules.
+
+        Keyword arguments:
+        rules -- Stopping_rules of the episodes
+        """
+        for engine in self.engines:
+            if engine.players_alive and rules.should_stop(engine):
+                engine.finish()
+
+    def deciding(self, interval = 1, skip_airborne = False):
+        """(episodes, players) mask of the dinosaurs to ask for a move,
+        see Dino_engine.deciding."""
+        return np.stack([engine.deciding(interval, skip_airborne)
+                         for engine in self.engines])
+
+    def step(self, actions = None):
+        """Advance every unfinished episode by one frame and return
+        (states, alive, scores).
+
+        Keyword arguments:
+        actions -- (episodes, players) jump flags (default None)
+        """
+        for i, engine in enumerate(self.engines):
+            if engine.players_alive or engine.state is None:
+                engine.step(None if actions is None else actions[i])
+        scores = [engine.score for engine in self.engines]
+        return self.states, self.alive, scores
+
+
+def measure_feature_costs(features, n_players = 100, frames = 600,
+                          seed = 0):
+    """Play a seeded game where the players jump at random and return the
+    mean time in seconds spent computing every feature per frame.
+
+    Keyword arguments:
+    features -- names or specs of the features to measure
+    n_players -- number of dinosaurs of the game (default 100)
+    frames -- number of frames played (default 600)
+    seed -- seed of the obstacles and the jumps (default 0)
+    """
+    observation = Observation(features, n_players, track_costs = True)
+    engine = Dino_engine(n_players, seed = seed, observation = observation)
+    rng = np.random.RandomState(seed)
+    actions = None
+    for frame in range(frames):
+        engine.step(actions)
+        actions = rng.random_sample(n_players) < 0.05
+    return observation.cost_report()
@@ -0,0 +1,75 @@
+import json
+import os
+from collections import OrderedDict
+
+
+class Fitness_cache:
+    """Scores of the genomes already played, memoized by phenotype.
+
+    A score only depends on the network of a genome, the seed of the
+    course, the rules of the engine and the settings of the game, so a key
+    made of these is enough to skip playing the same game twice (for
+    example the elites kept by Population.Epoch()). The least recently
+    used scores are evicted once max_size is reached. The scores can be
+    saved to a JSON file and loaded back by the next training.
+    """
+
+    def __init__(self, max_size = 100000, path = None):
+        """Initialize the cache, loading path if it exists.
+
+        Keyword arguments:
+        max_size -- number of scores kept (default 100000)
+        path -- JSON file the scores are saved to (default None, the
+                scores are only kept in memory)
+        """
+        self.max_size = max_size
+        self.path = path
+        self.scores = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        if path is not None and os.path.exists(path):
+            with open(path) as cache_file:
+                self.scores.update(json.load(cache_file))
+
+    def __len__(self):
+        return len(self.scores)
+
+    @staticmethod
+    def key(digest, seed, context):
+        """Return the key of a game.
+
+        Keyword arguments:
+        digest -- structural hash of the network, see
+                  Compiled_network.digest
+        seed -- seed of the course
+        context -- string describing the engine version and the settings
+                   of the game
+        """
+        return digest + ":" + str(seed) + ":" + context
+
+    def get(self, key):
+        """Return the score of a key, None if it is not cached."""
+        score = self.scores.get(key)
+        if score is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+            self.scores.move_to_end(key)
+        return score
+
+    def put(self, key, score):
+        """Cache the score of a key."""
+        self.scores[key] = score
+        self.scores.move_to_end(key)
+        if len(self.scores) > self.max_size:
+            self.scores.popitem(last = False)
+
+    def save(self):
+        """Write the scores to path, through a temporary file so an
+        interrupted save never leaves a truncated cache."""
+        if self.path is None:
+            return
+        temporary = self.path + ".tmp"
+        with open(temporary, "w") as cache_file:
+            json.dump(self.scores, cache_file)
+        os.replace(temporary, self.path)
@@ -0,0 +1,39 @@
+from collections import OrderedDict
+
+
+class Text_cache:
+    """Surfaces of rendered strings, memoized by string.
+
+    Rendering text is one of the most expensive calls of a frame while the
+    HUD rarely changes, so a string is only rendered the first time it is
+    shown. The least recently shown strings are evicted once max_size is
+    reached, which bounds the memory used by the ever changing scores.
+    """
+
+    def __init__(self, font, max_size = 64, color = (0, 0, 0)):
+        """Initialize the cache.
+
+        Keyword arguments:
+        font -- pygame font used to render the strings
+        max_size -- number of surfaces kept (default 64)
+        color -- color of the text (default black)
+        """
+        self.font = font
+        self.max_size = max_size
+        self.color = color
+        self.surfaces = OrderedDict()
+
+    def __len__(self):
+        return len(self.surfaces)
+
+    def render(self, text):
+        """Return the surface of a string, rendering it if needed."""
+        surface = self.surfaces.get(text)
+        if surface is None:
+            surface = self.font.render(text, False, self.color)
+            self.surfaces[text] = surface
+            if len(self.surfaces) > self.max_size:
+                self.surfaces.popitem(last = False)
+        else:
+            self.surfaces.move_to_end(text)
+        return surface
@@ -1,10 +1,17 @@
+import json
 import os
 import random
+from concurrent.futures import ProcessPoolExecutor
 
-import pygame
+import numpy as np
 import MultiNEAT as NEAT
 
-from dino import Dino_player,Dino
+from Dino import Dino_player,Dino_population,Dino,Render_policy
+from checkpoint import latest_checkpoint, write_checkpoint
+from engine import ENGINE_VERSION, Episode_batch, Obstacle_course
+from fitness_cache import Fitness_cache
+from network import Batched_network, Compiled_network, compile_network
+from observation import DEFAULT_FEATURES, observation_size
 
 
 class Dino_player_neat(Dino_player):
@@ -20,8 +27,9 @@ class Dino_player_neat(Dino_player):
         state -- current state of the game
         current_score -- current score of the game
         """
-        state.append(1)
-        self.network.Input(state)
+        inputs = list(state)
+        inputs.append(1)
+        self.network.Input(inputs)
         self.network.Activate()
         output = self.network.Output()
         if output[0] < self.jump_threshold:
@@ -37,47 +45,570 @@ class Dino_player_neat(Dino_player):
         """
         return False
 
+    def reset(self):
+        """Reset the activations of the network."""
+        self.network.Flush()
+
+
+class Dino_population_neat(Dino_population):
+    """Population of neural network players evaluated in one batch."""
+
+    def __init__(self, networks, jump_threshold = 0.5, lanes = 1):
+        """Compile the networks into one batched network.
+
+        Keyword arguments:
+        networks -- list of MultiNEAT neural networks or Compiled_network
+        jump_threshold -- output value from which a player jumps
+                          (default 0.5)
+        lanes -- number of games played at the same time (default 1)
+        """
+        super().__init__(len(networks))
+        compiled = list()
+        for network in networks:
+            if not isinstance(network, Compiled_network):
+                network = compile_network(network)
+            compiled.append(network)
+        self.network = Batched_network(compiled, lanes)
+        self.jump_threshold = jump_threshold
+        self.inputs = np.ones((lanes, 1, self.network.n_inputs))
+
+    def get_actions(self, state, current_score, alive):
+        """Return a jump flag for every player.
+
+        Keyword arguments:
+        state -- current state of the game shared by every player, or one
+                 state per player, in every lane
+        current_score -- current score of the game
+        alive -- boolean mask of the players still running, (players) or
+                 (lanes, players)
+        """
+        state = np.asarray(state, dtype=np.float64)
+        n_features = state.shape[-1]
+        state = state.reshape(self.network.lanes, -1, n_features)
+        if self.inputs.shape[1] != state.shape[1]:
+            self.inputs = np.ones(state.shape[:2] + (self.network.n_inputs,))
+        self.inputs[..., :n_features] = state
+        output = self.network.activate(self.inputs, alive)
+        jump = output[..., 0] >= self.jump_threshold
+        return jump.reshape(np.shape(alive)) & alive
+
+    def keep_playing(self, current_score):
+        """Return True to keep playing.
+
+        Keyword arguments:
+        current_score -- current score of the game
+        """
+        return False
+
+    def reset(self):
+        """Reset the activations of the networks."""
+        self.network.flush()
+
+
+def play_episodes(players, courses, decision_interval = 1,
+                  skip_airborne = False, stopping = None,
+                  features = DEFAULT_FEATURES, feature_offset = None,
+                  feature_scale = None, profiler = None):
+    """Play a population in one headless game per course and return the
+    (episodes, players) array of scores.
+
+    Keyword arguments:
+    players -- Dino_population with one lane per course
+    courses -- Obstacle_course, or seed of the obstacles, of every episode
+    decision_interval -- ask the players for a move every
+                         decision_interval frames (default 1)
+    skip_airborne -- do not ask the players in the middle of a jump
+                     (default False)
+    stopping -- Stopping_rules ending the episodes early (default None)
+    features -- features of the states (default DEFAULT_FEATURES)
+    feature_offset -- value subtracted from every feature, see Observation
+                      (default None)
+    feature_scale -- value multiplying every feature after the offset, see
+                     Observation (default None)
+    profiler -- Frame_profiler timing the phases of every frame
+                (default None)
+    """
+    episodes = Episode_batch(len(players), courses, features,
+                             feature_offset, feature_scale)
+    for engine in episodes.engines:
+        engine.profiler = profiler
+    actions = None
+    if stopping is not None:
+        stopping.start_game()
+    while episodes.players_alive:
+        if profiler is not None:
+            profiler.begin_frame()
+        states, alive, scores = episodes.step(actions)
+        if stopping is not None:
+            episodes.stop(stopping)
+            alive = episodes.alive
+        deciding = episodes.deciding(decision_interval, skip_airborne)
+        if profiler is not None:
+            profiler.lap("physics")
+        actions = players.decide(states, scores, alive, deciding)
+        if profiler is not None:
+            profiler.lap("network")
+            profiler.end_frame()
+    return episodes.fitness
+
+
+def aggregate_fitness(scores, aggregate = "mean"):
+    """Combine the (episodes, players) scores into one fitness per player.
+
+    Keyword arguments:
+    scores -- scores of every player in every episode
+    aggregate -- "mean", "min" or the quantile to keep as a float between
+                 0 and 1 (default "mean")
+    """
+    scores = np.asarray(scores)
+    if aggregate == "mean":
+        fitness = scores.mean(axis = 0)
+    elif aggregate == "min":
+        fitness = scores.min(axis = 0)
+    else:
+        fitness = np.quantile(scores, float(aggregate), axis = 0)
+    return fitness.tolist()
+
+
+def play_compiled(network, courses, jump_threshold = 0.5,
+                  decision_interval = 1, skip_airborne = False,
+                  stopping = None, features = DEFAULT_FEATURES,
+                  feature_offset = None, feature_scale = None):
+    """Play headless games with a compiled network and return its score
+    in every game with the number of activations run and saved.
+
+    The scores only depend on the obstacle courses. Used by the worker
+    processes of NEAT_trainer.
+
+    Keyword arguments:
+    network -- Compiled_network of the genome
+    courses -- Obstacle_course, or seed of the obstacles, of every game
+    jump_threshold -- output value from which the player jumps (default 0.5)
+    decision_interval -- ask the player for a move every decision_interval
+                         frames (default 1)
+    skip_airborne -- do not ask the player in the middle of a jump
+                     (default False)
+    stopping -- Stopping_rules ending the games early (default None)
+    features -- features of the states (default DEFAULT_FEATURES)
+    feature_offset -- value subtracted from every feature, see Observation
+                      (default None)
+    feature_scale -- value multiplying every feature after the offset, see
+                     Observation (default None)
+    """
+    player = Dino_population_neat([network], jump_threshold, len(courses))
+    scores = play_episodes(player, courses, decision_interval, skip_airborne,
+                           stopping, features, feature_offset, feature_scale)
+    return scores[:, 0].tolist(), player.activations, player.activations_saved
+
 
 class NEAT_trainer:
     """the class that trains a bot using neat."""
 
-    def __init__(self, population_size = 100, input_size = 9, output_size = 1,
-                 generations = 50):
+    def __init__(self, population_size = 100, input_size = None,
+                 output_size = 1, generations = 50, headless = False,
+                 workers = 0, episodes = 1, aggregate = "mean", seed = None,
+                 decision_interval = 1, skip_airborne = False,
+                 stopping = None, features = DEFAULT_FEATURES,
+                 feature_offset = None, feature_scale = None,
+                 cache = None, course_seeds = None, checkpoint_dir = None,
+                 checkpoint_every = 1, profiler = None, profile_path = None,
+                 render_policy = None):
         """Initialize the trainer.
 
         Keyword arguments:
         population_size -- number of genomes per generation (default 100)
-        input_size -- size of the input state + 1 (default 9)
+        input_size -- size of the input state + 1 (default None, derived
+                      from features)
         output_size -- size of the result of the genome neural networks (default 1)
         generations -- number of generations (default 50)
+        headless -- train without opening a window (default False)
+        workers -- number of processes evaluating the genomes headlessly
+                   when training one by one, 0 plays every genome in this
+                   process, in a window unless headless or episodes is
+                   more than one (default 0)
+        episodes -- number of seeded games played by every genome, more
+                    than one is always played headlessly (default 1)
+        aggregate -- how the scores of the episodes are combined into the
+                     fitness: "mean", "min" or a quantile (default "mean")
+        seed -- seed of the training, the same seed gives the same genomes
+                and games (default None, random games)
+        decision_interval -- ask the genomes for a move every
+                             decision_interval frames (default 1)
+        skip_airborne -- do not ask the genomes in the middle of a jump,
+                         which cannot be interrupted (default False)
+        stopping -- Stopping_rules ending every game early, the genomes
+                    still alive get the score reached, its time budget
+                    bounds each generation and is split between the
+                    genomes played alone, its top_k needs the genomes
+                    to play together (default None)
+        features -- features given to the genomes, see
+                    observation.FEATURES (default DEFAULT_FEATURES)
+        feature_offset -- value subtracted from every feature, see
+                          Observation, saved with the champion
+                          (default None)
+        feature_scale -- value multiplying every feature after the
+                         offset, see Observation, saved with the champion
+                         (default None)
+        cache -- Fitness_cache of the scores of the headless games, a
+                 genome whose network was already played on a course is
+                 not played again (default None)
+        course_seeds -- seeds of the courses played at every generation,
+                        which lets the cache skip the unchanged genomes
+                        (default None, new courses every generation)
+        checkpoint_dir -- directory where the training is saved, see
+                          save_checkpoint (default None, never saved)
+        checkpoint_every -- number of generations between two
+                            checkpoints (default 1)
+        profiler -- Frame_profiler timing the phases of the frames played
+                    in this process, its statistics are printed after
+                    every generation (default None)
+        profile_path -- JSON or CSV file the statistics of every
+                        generation are saved to (default None)
+        render_policy -- Render_policy of the watched games, the best
+                         genomes are ranked by the fitness kept from the
+                         previous generation (default None, paint
+                         everything until the 'r' key switches mode)
         """
         self.generations = generations
+        self.headless = headless
+        self.workers = workers
+        self.episodes = episodes
+        self.aggregate = aggregate
+        self.decision_interval = decision_interval
+        self.skip_airborne = skip_airborne
+        self.stopping = stopping
+        self.features = tuple(features)
+        self.feature_offset = feature_offset
+        self.feature_scale = feature_scale
+        self.cache = cache
+        self.course_seeds = course_seeds
+        self.checkpoint_dir = checkpoint_dir
+        self.checkpoint_every = checkpoint_every
+        self.profiler = profiler
+        self.profile_path = profile_path
+        if render_policy is None:
+            render_policy = Render_policy()
+        self.render_policy = render_policy
+        # Progress of the training, saved in the checkpoints.
+        self.generation = 0
+        self.best_genome = None
+        self.best_fitness = None
+        if input_size is None:
+            input_size = observation_size(self.features) + 1
+        if input_size != observation_size(self.features) + 1:
+            raise ValueError("input_size does not match the features")
+        if workers > 0 and stopping is not None and stopping.top_k is not None:
+            raise ValueError("top_k compares the genomes of one game, the "
+                             "workers play every genome alone")
+        # Number of network activations run and saved in the generation.
+        self.activations = 0
+        self.activations_saved = 0
+        self.rng = random.Random(seed)
         self.params = NEAT.Parameters()
         self.params.PopulationSize = population_size
         genome = NEAT.Genome(0, input_size, 0, output_size, False,
                      NEAT.ActivationFunction.UNSIGNED_SIGMOID,
                      NEAT.ActivationFunction.UNSIGNED_SIGMOID,
                      0, self.params, 0)
-        self.population = NEAT.Population(genome, self.params, True, 1.0, 0)
+        self.population = NEAT.Population(genome, self.params, True, 1.0,
+                                          0 if seed is None else seed)
 
-    def evaluate(self, genome, generation, genome_id):
+    def evaluate(self, genome, generation, genome_id, seed = None,
+                 stopping = None):
         """Generate a game, test the genome and return its fitness.
 
         Keyword arguments:
         genome -- genome to test
         generation -- number of the current generation
         genome_id -- genome id in the current generation
+        seed -- seed of the obstacles (default None, random game)
+        stopping -- Stopping_rules of the game (default None, the
+                    trainer's)
         """
+        if stopping is None:
+            stopping = self.stopping
         # create neural network from genome.
         net = NEAT.NeuralNetwork()
         genome.BuildPhenotype(net)
         # create player and .
         player = Dino_player_neat(net)
         text = "generation : " + str(generation) + " || genome : " + str(genome_id)
-        the_game = Dino(player, text)
+        the_game = Dino(player, text, seed,
+                        decision_interval = self.decision_interval,
+                        skip_airborne = self.skip_airborne,
+                        stopping = stopping, features = self.features,
+                        feature_offset = self.feature_offset,
+                        feature_scale = self.feature_scale,
+                        profiler = self.profiler,
+                        render_policy = self.render_policy)
         fitness = the_game.on_execute(start_immediately = True)
+        self.count_activations(the_game.players.activations,
+                               the_game.players.activations_saved)
         return fitness
 
+    def count_activations(self, activations, activations_saved):
+        """Add the activations run and saved by a game to the counters of
+        the generation."""
+        self.activations += activations
+        self.activations_saved += activations_saved
+
+    def report_activations(self):
+        """Print and reset the activation counters of the generation, only
+        when some activations can be saved."""
+        if self.decision_interval > 1 or self.skip_airborne:
+            total = self.activations + self.activations_saved
+            print("activations saved : ", self.activations_saved, "/",
+                  total)
+        self.activations = 0
+        self.activations_saved = 0
+
+    def record_best(self, genome_list, fitness_list):
+        """Keep a copy of the best genome trained so far."""
+        for genome, fitness in zip(genome_list, fitness_list):
+            if self.best_fitness is None or self.best_fitness < fitness:
+                self.best_fitness = fitness
+                self.best_genome = NEAT.Genome(genome)
+
+    def save_checkpoint(self):
+        """Save the population, the generator of the courses, the
+        generation counter and the best genome in checkpoint_dir.
+
+        The population is saved before the evaluation of self.generation,
+        MultiNEAT's own generator is not saved and is reseeded from the
+        saved generator of the courses on resume.
+        """
+        state = {"generation": self.generation,
+                 "rng": self.rng.getstate(),
+                 "best_fitness": self.best_fitness,
+                 "engine_version": ENGINE_VERSION}
+        def write_state(path):
+            with open(path, "w") as state_file:
+                json.dump(state, state_file)
+        writers = {"population.txt": self.population.Save,
+                   "trainer.json": write_state}
+        if self.best_genome is not None:
+            writers["best_genome.txt"] = self.best_genome.Save
+            writers["champion.npz"] = self.export_champion
+        return write_checkpoint(self.checkpoint_dir, self.generation,
+                                writers)
+
+    def load_checkpoint(self, directory):
+        """Resume the training from the latest checkpoint of a directory.
+
+        Keyword arguments:
+        directory -- checkpoint_dir of the interrupted training
+        """
+        path = latest_checkpoint(directory)
+        if path is None:
+            raise FileNotFoundError("no checkpoint in " + directory)
+        with open(os.path.join(path, "trainer.json")) as state_file:
+            state = json.load(state_file)
+        version, internal_state, gauss_next = state["rng"]
+        self.rng.setstate((version, tuple(internal_state), gauss_next))
+        self.population = NEAT.Population(
+                os.path.join(path, "population.txt")
+                )
+        # Derived from the restored state without drawing from it, so the
+        # courses stay the ones of the interrupted training.
+        seed = random.Random(str(self.rng.getstate())).randrange(2**31)
+        self.population.RNG.Seed(seed)
+        self.params = self.population.Parameters
+        self.generation = state["generation"]
+        self.best_fitness = state["best_fitness"]
+        best_genome_path = os.path.join(path, "best_genome.txt")
+        self.best_genome = None
+        if os.path.exists(best_genome_path):
+            self.best_genome = NEAT.Genome(best_genome_path)
+
+    def export_champion(self, path):
+        """Save the best genome trained so far as a compiled network,
+        played by Dino_player_compiled without MultiNEAT.
+
+        Keyword arguments:
+        path -- .npz file of the network
+        """
+        if self.best_genome is None:
+            raise ValueError("no genome has been evaluated yet")
+        net = NEAT.NeuralNetwork()
+        self.best_genome.BuildPhenotype(net)
+        metadata = {"features": np.array(self.features)}
+        if self.feature_offset is not None:
+            metadata["feature_offset"] = np.asarray(self.feature_offset,
+                                                    float)
+        if self.feature_scale is not None:
+            metadata["feature_scale"] = np.asarray(self.feature_scale, float)
+        compile_network(net).save(path, **metadata)
+
+    def end_generation(self):
+        """Advance to the next generation and save a checkpoint if due."""
+        self.population.Epoch()
+        self.generation += 1
+        if (self.checkpoint_dir is not None
+                and self.generation % self.checkpoint_every == 0):
+            self.save_checkpoint()
+
+    def split_stopping(self, count):
+        """Return the stopping rules of count genomes played alone one
+        after the other, each gets an equal part of the time budget so
+        the genomes played last are not cut at their first frame."""
+        if self.stopping is None:
+            return None
+        return self.stopping.split(count)
+
+    def start_clock(self):
+        """Start the time budget of the stopping rules, shared by every
+        game of the generation."""
+        if self.stopping is not None:
+            self.stopping.start()
+
+    def report_profile(self):
+        """Print the frame times of the generation and save them."""
+        if self.profiler is None or len(self.profiler) == 0:
+            return
+        summary = self.profiler.end_generation(self.generation)
+        print("frame times : ", self.profiler.report(summary))
+        if self.profile_path is not None:
+            self.profiler.save(self.profile_path)
+
+    def report_cache(self):
+        """Print the cache hits of the generation and save the cache."""
+        if self.cache is None:
+            return
+        print("cached games : ", self.cache.hits, "/",
+              self.cache.hits + self.cache.misses)
+        self.cache.hits = 0
+        self.cache.misses = 0
+        self.cache.save()
+
+    def draw_courses(self):
+        """Return the obstacle courses of the episodes of a generation."""
+        if self.course_seeds is not None:
+            return [Obstacle_course(seed) for seed in self.course_seeds]
+        return [Obstacle_course(self.rng.randrange(2**32))
+                for i in range(self.episodes)]
+
+    def cache_context(self):
+        """Return the engine version and the settings of the games as used
+        in the cache keys, None if the scores cannot be cached."""
+        if self.cache is None:
+            return None
+        stopping = self.stopping
+        if stopping is not None:
+            # A time budget makes the scores depend on the machine and top_k
+            # on the other genomes of the game.
+            if stopping.time_budget is not None or stopping.top_k is not None:
+                return None
+            stopping = (stopping.max_score, stopping.max_frames)
+        return repr((ENGINE_VERSION, self.features, self.feature_offset,
+                     self.feature_scale, self.decision_interval,
+                     self.skip_airborne, stopping))
+
+    def cached_scores(self, networks, courses):
+        """Return the cache keys of the games of every network and their
+        scores on the courses, None for the networks to play.
+
+        Keyword arguments:
+        networks -- compiled networks of the genomes
+        courses -- Obstacle_course of every game
+        """
+        context = self.cache_context()
+        if context is None or None in [course.seed for course in courses]:
+            return None, [None] * len(networks)
+        keys = list()
+        scores = list()
+        for network in networks:
+            digest = network.digest()
+            network_keys = [Fitness_cache.key(digest, course.seed, context)
+                            for course in courses]
+            network_scores = [self.cache.get(key) for key in network_keys]
+            keys.append(network_keys)
+            if None in network_scores:
+                network_scores = None
+            scores.append(network_scores)
+        return keys, scores
+
+    def store_scores(self, keys, scores, played):
+        """Cache the scores of the networks played.
+
+        Keyword arguments:
+        keys -- cache keys returned by cached_scores
+        scores -- scores of every network on every course
+        played -- indices of the networks played
+        """
+        if keys is None:
+            return
+        for i in played:
+            for key, score in zip(keys[i], scores[i]):
+                self.cache.put(key, score)
+
+    def evaluate_episodes(self, networks):
+        """Play the whole population in headless seeded episodes and
+        return the aggregated fitness of every genome.
+
+        Keyword arguments:
+        networks -- neural networks of the genomes
+        """
+        courses = self.draw_courses()
+        networks = [network if isinstance(network, Compiled_network)
+                    else compile_network(network) for network in networks]
+        keys, scores = self.cached_scores(networks, courses)
+        missing = [i for i, score in enumerate(scores) if score is None]
+        if missing:
+            players = Dino_population_neat([networks[i] for i in missing],
+                                           lanes = len(courses))
+            played = play_episodes(players, courses, self.decision_interval,
+                                   self.skip_airborne, self.stopping,
+                                   self.features, self.feature_offset,
+                                   self.feature_scale, self.profiler)
+            self.count_activations(players.activations,
+                                   players.activations_saved)
+            for j, i in enumerate(missing):
+                scores[i] = played[:, j].tolist()
+            self.store_scores(keys, scores, missing)
+        return aggregate_fitness(np.transpose(scores), self.aggregate)
+
+    def evaluate_parallel(self, genome_list, executor):
+        """Test the genomes in headless games on the worker processes and
+        return their fitness.
+
+        Every genome plays the same obstacle courses, drawn from the
+        trainer's generator before the games are dispatched, so the
+        results do not depend on which worker runs which game.
+
+        Keyword arguments:
+        genome_list -- genomes to test
+        executor -- concurrent.futures executor running the games
+        """
+        networks = list()
+        for genome in genome_list:
+            net = NEAT.NeuralNetwork()
+            genome.BuildPhenotype(net)
+            networks.append(compile_network(net))
+        courses = self.draw_courses()
+        keys, scores = self.cached_scores(networks, courses)
+        missing = [i for i, score in enumerate(scores) if score is None]
+        count = len(missing)
+        # Every genome gets its part of the generation's time budget.
+        stopping = self.split_stopping(count)
+        chunksize = max(1, count // (4 * self.workers))
+        results = executor.map(play_compiled,
+                               [networks[i] for i in missing],
+                               [courses] * count,
+                               [0.5] * count,
+                               [self.decision_interval] * count,
+                               [self.skip_airborne] * count,
+                               [stopping] * count,
+                               [self.features] * count,
+                               [self.feature_offset] * count,
+                               [self.feature_scale] * count,
+                               chunksize = chunksize)
+        for i, (network_scores, activations, activations_saved) in zip(
+                missing, results):
+            scores[i] = network_scores
+            self.count_activations(activations, activations_saved)
+        self.store_scores(keys, scores, missing)
+        return aggregate_fitness(np.transpose(scores), self.aggregate)
+
     def start_cycle(self, one_by_one = False):
         """Start the cycle.
 
@@ -85,42 +616,95 @@ class NEAT_trainer:
         one_by_one -- evaluate the genomes one by one if True (default False)
         """
         if one_by_one:
+            if (self.workers == 0 and self.episodes == 1
+                    and not self.headless and self.stopping is not None
+                    and self.stopping.top_k is not None):
+                raise ValueError("top_k compares the genomes of one game, "
+                                 "the watched genomes play alone")
             # play each genome in a game alone.
-            for generation in range(self.generations):
+            executor = None
+            if self.workers > 0:
+                executor = ProcessPoolExecutor(self.workers)
+            for generation in range(self.generation, self.generations):
+                self.start_clock()
                 # retrieve genome list and call evaluation function for each one.
                 genome_list = NEAT.GetGenomeList(self.population)
                 best_fitness = 0
                 print("generation",generation + 1,":")
                 print("testing " + str(self.params.PopulationSize) + " genomes : ")
-                i = 0
-                for genome in genome_list:
-                    i += 1
-                    print(i, end = " ")
-                    net = NEAT.NeuralNetwork()
-                    genome.BuildPhenotype(net)
-                    fitness = self.evaluate(genome, generation + 1, i)
+                if executor is not None:
+                    fitness_list = self.evaluate_parallel(genome_list,
+                                                          executor)
+                elif self.episodes > 1 or self.headless:
+                    # The games cannot be watched, play them headlessly.
+                    networks = list()
+                    for genome in genome_list:
+                        net = NEAT.NeuralNetwork()
+                        genome.BuildPhenotype(net)
+                        networks.append(net)
+                    fitness_list = self.evaluate_episodes(networks)
+                else:
+                    fitness_list = list()
+                    seed = self.draw_courses()[0].seed
+                    stopping = self.split_stopping(len(genome_list))
+                    for i, genome in enumerate(genome_list, 1):
+                        print(i, end = " ")
+                        fitness_list.append(
+                                self.evaluate(genome, generation + 1, i, seed,
+                                              stopping)
+                                )
+                for genome, fitness in zip(genome_list, fitness_list):
                     if best_fitness < fitness:
                         best_fitness = fitness
                     genome.SetFitness(fitness)
+                self.record_best(genome_list, fitness_list)
                 # print best fitness and advance to the next generation
                 print("best fitness : ", best_fitness)
+                self.report_activations()
+                self.report_cache()
+                self.report_profile()
                 print("=======================================")
-                self.population.Epoch()
+                self.end_generation()
+            if executor is not None:
+                executor.shutdown()
         else:
             # play all of the population at the same time
-            for generation in range(self.generations):
-                # retrieve genome list and build the players list.
+            for generation in range(self.generation, self.generations):
+                self.start_clock()
+                rng_state = self.rng.getstate()
+                # retrieve genome list and build the batched players.
                 genome_list = NEAT.GetGenomeList(self.population)
-                players = list()
+                networks = list()
                 for genome in genome_list:
                     net = NEAT.NeuralNetwork()
                     genome.BuildPhenotype(net)
-                    players.append(Dino_player_neat(net))
-                # start game and retrieve fitness list.
-                the_game = Dino_NEAT(players, generation)
-                fitness = the_game.on_execute()
+                    networks.append(net)
+                # start game and retrieve fitness list, the headless
+                # games are played as episodes to go through the cache.
+                if self.episodes > 1 or (self.headless
+                                         and self.cache is not None):
+                    fitness = self.evaluate_episodes(networks)
+                else:
+                    players = Dino_population_neat(networks)
+                    # The genomes kept by Epoch() have their fitness.
+                    self.render_policy.rank([genome.GetFitness()
+                                             for genome in genome_list])
+                    the_game = Dino_NEAT(players, generation, self.headless,
+                                         self.draw_courses()[0].seed,
+                                         self.decision_interval,
+                                         self.skip_airborne, self.stopping,
+                                         self.features, self.feature_offset,
+                                         self.feature_scale, self.profiler,
+                                         self.render_policy)
+                    fitness = the_game.on_execute()
+                    self.count_activations(players.activations,
+                                           players.activations_saved)
                 if fitness is None:
                     print("Training stopped.")
+                    if self.checkpoint_dir is not None:
+                        # Replay the same courses when resuming.
+                        self.rng.setstate(rng_state)
+                        print("Saved in", self.save_checkpoint())
                     break
                 # assign each genome to its corresponding fitness.
                 best_fitness = 0
@@ -129,410 +713,88 @@ class NEAT_trainer:
                     if best_fitness < fitness[i]:
                         best_fitness = fitness[i]
                     genome.SetFitness(fitness[i])
+                self.record_best(genome_list, fitness)
                 # print best fitness and advance to the next generation
                 print("generation",generation,":",best_fitness)
-                self.population.Epoch()
+                self.report_activations()
+                self.report_cache()
+                self.report_profile()
+                self.end_generation()
 
 
 
-class Dino_NEAT:
-    """A modified version of the Dino game class which is capable
-    of showing multiple non-human players at a time."""
+class Dino_NEAT(Dino):
+    """A modified version of the Dino game class which shows the
+    progress of a generation of non-human players."""
 
-    def __init__(self, players, generation):
+    def __init__(self, players, generation, headless = False, seed = None,
+                 decision_interval = 1, skip_airborne = False,
+                 stopping = None, features = DEFAULT_FEATURES,
+                 feature_offset = None, feature_scale = None,
+                 profiler = None, render_policy = None):
         """Initialize the variables and declare constants.
 
         Keyword arguments:
-        players -- list of players
+        players -- list of players or a Dino_population
         generation -- number of the current generation
+        headless -- simulate without opening a window (default False)
+        seed -- seed of the obstacles (default None, random games)
+        decision_interval -- ask the players for a move every
+                             decision_interval frames (default 1)
+        skip_airborne -- do not ask the players in the middle of a jump
+                         (default False)
+        stopping -- Stopping_rules ending the generation early, the
+                    players still alive get the current score (default None)
+        features -- features of the state (default DEFAULT_FEATURES)
+        feature_offset -- value subtracted from every feature, see
+                          Observation (default None)
+        feature_scale -- value multiplying every feature after the
+                         offset, see Observation (default None)
+        profiler -- Frame_profiler timing the phases of every frame
+                    (default None)
+        render_policy -- Render_policy choosing the frames and the
+                         players painted (default None, everything)
         """
-        # Declare constants.
-        self.SIZE = self.WEIGHT, self.HEIGHT = 640, 400
-        self.DINO_INITIAL_X = 100
-        self.DINO_INITIAL_Y = 250
-        self.MAX_JUMP_HEIGHT = 100
-        self.JUMP_SPEED_A = 0.5
-        self.JUMP_SPEED_D = 0.5
-        self.DINO_MOVE_SPEED = 0.1
-        self.GROUND_INITIAL_SPEED = 6
-        self.COLLISION_FORGIVE = 8
-        # Initialize flags.
-        self.running = True
-        self.jumping_a = False
-        self.jumping_d = False
-        self.first_frame = True
-        self.stop_training = False
-        # Initialize rest of variables.
-        self.players = list()
-        for player in players:
-            player_data = dict()
-            player_data["player"] = player
-            player_data["jumping_a"] = False
-            player_data["jumping_d"] = False
-            player_data["alive"] = True
-            player_data["dino_x"] = self.DINO_INITIAL_X
-            player_data["dino_y"] = self.DINO_INITIAL_Y
-            player_data["rect"] = None
-            player_data["fitness"] = 0
-            self.players.append(player_data)
+        super().__init__(players, seed = seed, headless = headless,
+                         decision_interval = decision_interval,
+                         skip_airborne = skip_airborne, stopping = stopping,
+                         features = features, feature_offset = feature_offset,
+                         feature_scale = feature_scale, profiler = profiler,
+                         render_policy = render_policy)
         self.generation = generation
-        self.players_alive = len(self.players)
-        self.display_surf = None
-        self.move_counter = 0
-        self.game_time = 0
-        self.most_recent_score = 0
-        self.obstacle_distance = 0
-        self.possible_obstacles = list()
-        self.obstacles = list()
-
-    def on_init(self):
-        """Initialize the pygame specific variables
-        and load the images.
-        """
-        script_dir = os.path.dirname(__file__)
-        # Initialize the main window.
-        pygame.init()
-        logo = pygame.image.load(os.path.join(script_dir, "images/dino.jpg"))
-        pygame.display.set_icon(logo)
-        pygame.display.set_caption("Dino")
-        self.display_surf = pygame.display.set_mode(
-                self.SIZE, pygame.HWSURFACE | pygame.DOUBLEBUF
-                )
-        # Initialize the clock and the font system.
-        self.clock = pygame.time.Clock()
-        pygame.font.init()
-        self.text_font = pygame.font.SysFont('Comic Sans MS', 20)
-        self.instuction_up = self.text_font.render(
-                        "Press the UP arrow to jump",
-                        False,
-                        (0, 0, 0)
-                        )
-        # Load the ground image, split it and save the fragments in a list.
-        ground = pygame.image.load(os.path.join(script_dir,
-                                                "images/ground.png"))
-        ground.set_colorkey((64, 202, 201))
-        self.ground_parts = []
-        x, y, dx, dy = 0, 0, 1, ground.get_height()
-        self.ground = ground
-        while x<ground.get_width():
-            rect = pygame.Rect((x,y,dx,dy))
-            ground_part = pygame.Surface(rect.size).convert()
-            ground_part.blit(ground, (0, 0), rect)
-            ground_part.set_colorkey((64,202,201))
-            self.ground_parts.append(ground_part)
-            x += dx
-        #Load the obstacle sprites.
-        cactus_b_1 = pygame.image.load(
-                os.path.join(script_dir, "images/cactus_b_1.png")
-                ).convert()
-        cactus_b_1.set_colorkey((64,202,201))
-        self.possible_obstacles.append(cactus_b_1)
-        cactus_s_1 = pygame.image.load(
-                os.path.join(script_dir, "images/cactus_s_1.png")
-                ).convert()
-        cactus_s_1.set_colorkey((64,202,201))
-        self.possible_obstacles.append(cactus_s_1)
-        #Load the dinosaur sprites and initialize the rest of the variables.
-        self.dino_move_1 = pygame.image.load(
-                os.path.join(script_dir, "images/dino_move_1.png")
-                ).convert()
-        self.dino_move_1.set_colorkey((64,202,201))
-        self.dino_move_2 = pygame.image.load(
-                os.path.join(script_dir, "images/dino_move_2.png")
-                ).convert()
-        self.dino_move_2.set_colorkey((64,202,201))
-        self.dino_jump = pygame.image.load(
-                os.path.join(script_dir, "images/dino_jump.png")
-                ).convert()
-        self.dino_jump.set_colorkey((64,202,201))
-        self.dino_dead = pygame.image.load(
-                os.path.join(script_dir, "images/dino_dead.png")
-                ).convert()
-        self.dino_dead.set_colorkey((64,202,201))
-        self.dino_y = self.DINO_INITIAL_Y
-        self.dino_x = self.DINO_INITIAL_X
-        self.running = True
-
-    def reinit(self):
-        """Reinitialize the flags and variables."""
-        for player in self.players:
-            player["jumping_a"] = False
-            player["jumping_d"] = False
-            player["alive"] = True
-            player["dino_x"] = self.DINO_INITIAL_X
-            player["dino_y"] = self.DINO_INITIAL_Y
-            player["rect"] = None
-            player["fitness"] = 0
-        self.obstacles = list()
-        self.obstacle_distance = 0
-        self.move_counter = 0
-        self.game_time = 0
-        self.ground_move = 0
-        self.clock.tick(60)
-
-    def jump(self, player):
-        """Trigger jumping event if possible."""
-        if not(player["jumping_a"] or player["jumping_d"]):
-            player["jumping_a"] = True
+        self.stop_training = False
 
     def on_event(self, event):
         """Detect events and change flags accordingly."""
+        import pygame
         if event.type == pygame.QUIT:
             self.running = False
+            self.window_closed = True
             self.stop_training = True
+        if event.type == pygame.KEYDOWN and event.key == pygame.K_r:
+            self.switch_render_mode()
 
-    def on_loop(self):
-        """Update variables and move objects."""
-        dt = self.clock.tick(60)
-        self.game_time += dt
-        #Update dinosaur locations if jumping.
-        for player in self.players:
-            if player["alive"]:
-                if player["jumping_a"]:
-                    if player["dino_y"] <= (
-                            self.DINO_INITIAL_Y - self.MAX_JUMP_HEIGHT
-                            ):
-                        player["jumping_a"] = False
-                        player["jumping_d"] = True
-                    elif player["dino_y"] <= (self.DINO_INITIAL_Y
-                                       - self.MAX_JUMP_HEIGHT/1.5):
-                        player["dino_y"] -= self.JUMP_SPEED_A * dt/2
-                    else:
-                        player["dino_y"] -= self.JUMP_SPEED_A * dt
-                if player["jumping_d"]:
-                    if player["dino_y"] >= self.DINO_INITIAL_Y:
-                        player["jumping_d"] = False
-                        player["dino_y"] = self.DINO_INITIAL_Y
-                    elif player["dino_y"] <= (self.DINO_INITIAL_Y
-                                         - self.MAX_JUMP_HEIGHT/1.5):
-                        player["dino_y"] += self.JUMP_SPEED_D * dt/2
-                    else:
-                        player["dino_y"] += self.JUMP_SPEED_D*dt
-        #Update dinosaur movement animaton
-        self.move_counter += self.DINO_MOVE_SPEED
-        if self.move_counter >= 10:
-            self.move_counter = 0
-        #Update ground location
-        self.ground_step = (
-                self.GROUND_INITIAL_SPEED
-                * ( 0.125*(self.game_time//10000) + 1)
-                )
-        self.ground_parts = (
-                self.ground_parts[int(self.ground_step):]
-                + self.ground_parts[:int(self.ground_step)]
-                )
-        #Generate obstacles and update their location
-        self.obstacle_distance += int(self.ground_step)
-        if 300 < self.obstacle_distance <= 900:
-            gen_num = random.uniform(0,1)
-            if gen_num < 0.05 :
-                generate_obstacles = True
-            else:
-                generate_obstacles = False
-        elif 900 < self.obstacle_distance:
-            generate_obstacles = True
-        else:
-            generate_obstacles = False
-        if generate_obstacles:
-            number_obstacles = random.randint(1,4)
-            last_x = self.display_surf.get_width()
-            for i in range(number_obstacles):
-                chosen_obstacle = random.choice(self.possible_obstacles)
-                self.obstacles.append([
-                        chosen_obstacle,
-                        [last_x, self.DINO_INITIAL_Y +
-                            self.dino_move_1.get_height() -
-                            chosen_obstacle.get_height()]
-                        ])
-                last_x += chosen_obstacle.get_width()
-            self.obstacle_distance = 0
-        obstacles=list()
-        for obstacle in self.obstacles:
-            obstacle[1][0] -= int(self.ground_step)
-            if not obstacle[1][0] + obstacle[0].get_width() <= 0 :
-                obstacles.append(obstacle)
-        self.obstacles = obstacles
-
-    def on_render(self):
-        """Clear screen and repaint objects with updated data."""
-        #Clear screen
-        self.display_surf.fill((255,255,255))
-        #Paint ground
-        ground_x=0
-        for ground in self.ground_parts:
-            self.display_surf.blit(ground, (ground_x,self.DINO_INITIAL_Y+35))
-            ground_x += ground.get_width()
-        #Paint instruction text
-        score = self.text_font.render(
-                str(int(self.game_time/100)),
-                False,
-                (0, 0, 0)
-                )
-        self.display_surf.blit(
-                score,
-                (self.display_surf.get_width() - (5+score.get_width()), 0)
-                )
-        generation_text = self.text_font.render(
-            "generation " + str(self.generation),
-            False,
-            (0, 0, 0)
-            )
-        self.display_surf.blit(
-                generation_text,
-                (self.display_surf.get_width()//2
-                 - generation_text.get_width()//2,0)
-                )
-        players_alive = self.text_font.render(
-            "players alive " + str(self.players_alive),
-            False,
-            (0, 0, 0)
-            )
-        self.display_surf.blit(
-                players_alive,
-                (self.display_surf.get_width()//2
-                 - players_alive.get_width()//2,25)
+    def keep_playing(self):
+        """The generation is over once every player is dead."""
+        return False
+
+    def draw_hud(self):
+        """Paint the generation and the number of players alive."""
+        self.renderer.draw_centered("generation " + str(self.generation), 0)
+        self.renderer.draw_centered(
+                "players alive " + str(self.engine.players_alive), 25
                 )
-        #Paint Dinosaurs
-        for player in self.players:
-            if player["alive"]:
-                if player["jumping_a"] or player["jumping_d"]:
-                    dino_rect = self.display_surf.blit(
-                            self.dino_jump,
-                            (player["dino_x"], player["dino_y"])
-                            )
-                else:
-                    if int(self.move_counter%2)==1:
-                        dino_rect = self.display_surf.blit(
-                                self.dino_move_1,
-                                (player["dino_x"], player["dino_y"])
-                                )
-                    else:
-                        dino_rect = self.display_surf.blit(
-                                self.dino_move_2,
-                                (player["dino_x"], player["dino_y"])
-                                )
-                dino_rect = pygame.Rect(
-                        dino_rect.left + self.COLLISION_FORGIVE,
-                        dino_rect.top + self.COLLISION_FORGIVE,
-                        dino_rect.width - 2 * self.COLLISION_FORGIVE,
-                        dino_rect.height - 2 * self.COLLISION_FORGIVE
-                        )
-                player["rect"] = dino_rect
-        #Paint obstacles
-        obstacle_rects = list()
-        closest_obstacle = 0
-        closest_obstacle_distance = None
-        closest_obstacle_heights = [0,0,0,0,0]
-        next_closest_obstacle_distance = None
-        i = 0
-        for obstacle in self.obstacles:
-            if closest_obstacle is not None :
-                obstacle_rect = self.display_surf.blit(
-                        obstacle[0],
-                        (obstacle[1][0], obstacle[1][1])
-                        )
-                obstacle_rect = pygame.Rect(
-                        obstacle_rect.left + self.COLLISION_FORGIVE,
-                        obstacle_rect.top + self.COLLISION_FORGIVE,
-                        obstacle_rect.width - 2 * self.COLLISION_FORGIVE,
-                        obstacle_rect.height - 2 * self.COLLISION_FORGIVE
-                        )
-                if closest_obstacle == 0:
-                    if dino_rect.left <= obstacle_rect.right:
-                        obstacle_rects.append(obstacle_rect)
-                        closest_obstacle = (obstacle_rect.right
-                                            + self.COLLISION_FORGIVE)
-                        closest_obstacle_distance = (obstacle_rect.left
-                                            - dino_rect.right)
-                        closest_obstacle_heights[i] = obstacle_rect.top
-                        previous_top = obstacle_rect.top
-                        i += 1
-                else:
-                    if closest_obstacle == (obstacle_rect.left
-                                            -  self.COLLISION_FORGIVE):
-                        obstacle_rects.append(obstacle_rect)
-                        closest_obstacle += (obstacle_rect.width
-                                            + 2 * self.COLLISION_FORGIVE)
-                        closest_obstacle_heights[i] = max(
-                                obstacle_rect.top,
-                                previous_top
-                                )
-                        previous_top = obstacle_rect.top
-                        i += 1
-                    else:
-                        closest_obstacle = None
-                        closest_obstacle_heights[i] = previous_top
-            else:
-                obstacle_rect = self.display_surf.blit(
-                        obstacle[0],
-                        (obstacle[1][0], obstacle[1][1])
-                        )
-                obstacle_rect = pygame.Rect(
-                        obstacle_rect.left + self.COLLISION_FORGIVE,
-                        obstacle_rect.top + self.COLLISION_FORGIVE,
-                        obstacle_rect.width - 2 * self.COLLISION_FORGIVE,
-                        obstacle_rect.height - 2 * self.COLLISION_FORGIVE
-                        )
-                if next_closest_obstacle_distance is None:
-                    next_closest_obstacle_distance = (
-                            obstacle_rect.left - dino_rect.right
-                            )
-        if next_closest_obstacle_distance is None:
-            next_closest_obstacle_distance = (
-                    self.display_surf.get_width() - dino_rect.right
-                    )
-        if closest_obstacle_distance is None:
-            closest_obstacle_distance = (
-                    self.display_surf.get_width() - dino_rect.right
+        if self.render_policy is not None:
+            self.renderer.draw_centered(
+                    self.render_policy.describe() + " ('r' to switch)", 50
                     )
-        # Detect collision
-        for player in self.players:
-            if player["alive"]:
-                for obstacle_rect in obstacle_rects:
-                    if player["rect"].colliderect(obstacle_rect):
-                        player["alive"] = False
-                        player["fitness"]= int(self.game_time/100)
-                        break
-        # Update screen
-        pygame.display.flip()
-        # Request next move.
-        state = [
-            int(self.ground_step),
-            closest_obstacle_distance,
-            next_closest_obstacle_distance
-            ]
-        state.extend(closest_obstacle_heights)
-        self.players_alive = 0
-        for player in self.players:
-            if player["alive"]:
-                self.players_alive += 1
-                next_action = player["player"].get_action(state,
-                                    int(self.game_time/100))
-                if next_action:
-                    self.jump(player)
-        if self.players_alive == 0:
-            self.running = False
-
-    def on_cleanup(self):
-        """Close game"""
-        pygame.quit()
 
     def on_execute(self):
-        """Execute game loop"""
-        if self.on_init() == False:
-            self.running = False
-        while( self.running ):
-            for event in pygame.event.get():
-                self.on_event(event)
-            self.on_loop()
-            self.on_render()
-        self.on_cleanup()
-        fitness = list()
-        for player in self.players:
-            fitness.append(player["fitness"])
+        """Execute game loop and return the fitness of every player."""
+        super().on_execute(start_immediately = True)
         if self.stop_training:
-            fitness = None
-        return fitness
+            return None
+        return self.engine.fitness.tolist()
 
 
 if __name__ == "__main__" :
@@ -0,0 +1,227 @@
+import hashlib
+
+import numpy as np
+
+
+def _sigmoid(x, a, b):
+    return 1.0 / (1.0 + np.exp(-a*x - b))
+
+
+# Activation functions of MultiNEAT neurons, x is the sum of the incoming
+# signals and a, b are the slope and shift of the neuron.
+ACTIVATION_FUNCTIONS = {
+        "UNSIGNED_SIGMOID": _sigmoid,
+        "SIGNED_SIGMOID": lambda x, a, b: 2*_sigmoid(x, a, b) - 1,
+        "TANH": lambda x, a, b: np.tanh(x*a),
+        "TANH_CUBIC": lambda x, a, b: np.tanh(x*x*x*a),
+        "SIGNED_STEP": lambda x, a, b: np.where(x > b, 1.0, -1.0),
+        "UNSIGNED_STEP": lambda x, a, b: np.where(x > 0.5 + b, 1.0, 0.0),
+        "SIGNED_GAUSS": lambda x, a, b: 2*np.exp(-a*x*x + b) - 1,
+        "UNSIGNED_GAUSS": lambda x, a, b: np.exp(-a*x*x + b),
+        "ABS": lambda x, a, b: np.abs(x + b),
+        "SIGNED_SINE": lambda x, a, b: np.sin(x*a + b),
+        "UNSIGNED_SINE": lambda x, a, b: (np.sin(x*a + b) + 1) / 2,
+        "LINEAR": lambda x, a, b: x + b,
+        "RELU": lambda x, a, b: np.where(x > 0, x, 0.0),
+        "SOFTPLUS": lambda x, a, b: np.log1p(np.exp(x)),
+        }
+ACTIVATION_NAMES = list(ACTIVATION_FUNCTIONS)
+# Arrays of a network saved by Compiled_network.save.
+NETWORK_ARRAYS = ("weights", "slopes", "shifts", "functions", "n_inputs",
+                  "n_outputs")
+
+
+class Compiled_network:
+    """A MultiNEAT phenotype stored as NumPy arrays.
+
+    Neurons keep MultiNEAT's order (inputs, outputs then hidden neurons)
+    and one call to activate() matches one call to NeuralNetwork.Activate:
+    every non-input neuron is updated once from the previous activations.
+    """
+
+    def __init__(self, weights, slopes, shifts, functions, n_inputs,
+                 n_outputs):
+        """Initialize the network.
+
+        Keyword arguments:
+        weights -- (neurons, neurons) matrix, weights[target, source]
+        slopes -- activation slope (a) of every neuron
+        shifts -- activation shift (b) of every neuron
+        functions -- index in ACTIVATION_NAMES of every neuron's function
+        n_inputs -- number of input neurons, bias included
+        n_outputs -- number of output neurons
+        """
+        self.weights = np.asarray(weights, dtype=np.float64)
+        self.slopes = np.asarray(slopes, dtype=np.float64)
+        self.shifts = np.asarray(shifts, dtype=np.float64)
+        self.functions = np.asarray(functions, dtype=np.int8)
+        self.n_inputs = n_inputs
+        self.n_outputs = n_outputs
+        self.flush()
+
+    @property
+    def size(self):
+        """Number of neurons of the network."""
+        return len(self.slopes)
+
+    def flush(self):
+        """Reset the activations of every neuron."""
+        self.activations = np.zeros(self.size)
+
+    def save(self, path, **metadata):
+        """Save the network to a NumPy .npz file, loaded by load_network.
+
+        Keyword arguments:
+        path -- path of the file
+        metadata -- extra arrays saved with the network, for example the
+                    features of its inputs
+        """
+        np.savez(path, weights=self.weights, slopes=self.slopes,
+                 shifts=self.shifts,
+                 functions=np.array([ACTIVATION_NAMES[function]
+                                     for function in self.functions]),
+                 n_inputs=self.n_inputs, n_outputs=self.n_outputs,
+                 **metadata)
+
+    def digest(self):
+        """Return a hash of the structure and parameters of the network,
+        networks with the same digest always give the same outputs."""
+        digest = hashlib.sha1()
+        digest.update(np.array([self.n_inputs, self.n_outputs]).tobytes())
+        for array in (self.weights, self.slopes, self.shifts,
+                      self.functions):
+            digest.update(np.ascontiguousarray(array).tobytes())
+        return digest.hexdigest()
+
+    def activate(self, inputs):
+        """Propagate the inputs once and return the outputs."""
+        self.activations[:self.n_inputs] = inputs
+        signals = self.weights @ self.activations
+        self.activations[self.n_inputs:] = _apply_functions(
+                signals, self.slopes, self.shifts, self.functions
+                )[self.n_inputs:]
+        return self.activations[self.n_inputs:self.n_inputs+self.n_outputs]
+
+
+def compile_network(network):
+    """Convert a MultiNEAT NeuralNetwork into a Compiled_network."""
+    neurons = network.neurons
+    size = len(neurons)
+    weights = np.zeros((size, size))
+    for connection in network.connections:
+        weights[connection.target_neuron_idx,
+                connection.source_neuron_idx] += connection.weight
+    functions = list()
+    for neuron in neurons:
+        name = neuron.activation_function_type.name
+        if name not in ACTIVATION_FUNCTIONS:
+            raise ValueError("unsupported activation function " + name)
+        functions.append(ACTIVATION_NAMES.index(name))
+    return Compiled_network(weights,
+                            [neuron.a for neuron in neurons],
+                            [neuron.b for neuron in neurons],
+                            functions,
+                            network.NumInputs(),
+                            network.NumOutputs())
+
+
+def load_network(path):
+    """Load a network saved by Compiled_network.save and return it with
+    the dict of its metadata."""
+    with np.load(path) as data:
+        functions = [ACTIVATION_NAMES.index(name)
+                     for name in data["functions"].tolist()]
+        network = Compiled_network(data["weights"], data["slopes"],
+                                   data["shifts"], functions,
+                                   int(data["n_inputs"]),
+                                   int(data["n_outputs"]))
+        metadata = {key: data[key] for key in data.files
+                    if key not in NETWORK_ARRAYS}
+    return network, metadata
+
+
+def _apply_functions(signals, slopes, shifts, functions):
+    """Pass every signal through the activation function of its neuron."""
+    used = np.unique(functions)
+    with np.errstate(over="ignore"):
+        if len(used) == 1:
+            return ACTIVATION_FUNCTIONS[ACTIVATION_NAMES[used[0]]](
+                    signals, slopes, shifts
+                    )
+        result = np.zeros_like(signals)
+        for function in used:
+            values = ACTIVATION_FUNCTIONS[ACTIVATION_NAMES[function]](
+                    signals, slopes, shifts
+                    )
+            result = np.where(functions == function, values, result)
+    return result
+
+
+class Batched_network:
+    """A population of compiled networks evaluated together.
+
+    The networks are padded to the same number of neurons and stacked so
+    one activate() call runs every network of the population with a single
+    batched matrix product. The activations can be kept for several lanes
+    (for example one per episode) that share the same weights.
+    """
+
+    def __init__(self, networks, lanes = 1):
+        """Stack the networks.
+
+        Keyword arguments:
+        networks -- list of Compiled_network with the same inputs/outputs
+        lanes -- number of independent activation states (default 1)
+        """
+        assert len(networks) > 0
+        self.n_inputs = networks[0].n_inputs
+        self.n_outputs = networks[0].n_outputs
+        assert all(network.n_inputs == self.n_inputs
+                   and network.n_outputs == self.n_outputs
+                   for network in networks)
+        size = max(network.size for network in networks)
+        count = len(networks)
+        self.weights = np.zeros((count, size, size))
+        self.slopes = np.zeros((count, size))
+        self.shifts = np.zeros((count, size))
+        # Padding neurons have no connections, LINEAR keeps them at 0.
+        self.functions = np.full((count, size),
+                                 ACTIVATION_NAMES.index("LINEAR"),
+                                 dtype=np.int8)
+        for i, network in enumerate(networks):
+            n = network.size
+            self.weights[i, :n, :n] = network.weights
+            self.slopes[i, :n] = network.slopes
+            self.shifts[i, :n] = network.shifts
+            self.functions[i, :n] = network.functions
+        self.lanes = lanes
+        self.flush()
+
+    def __len__(self):
+        return len(self.weights)
+
+    def flush(self):
+        """Reset the activations of every network and lane."""
+        self.activations = np.zeros((self.lanes,) + self.slopes.shape)
+
+    def activate(self, inputs, active = None):
+        """Propagate the inputs once and return the outputs.
+
+        Keyword arguments:
+        inputs -- input values broadcastable to (lanes, networks, inputs),
+                  a single state is shared by every network
+        active -- boolean mask broadcastable to (lanes, networks), only
+                  these networks are updated (default None, all of them)
+        Returns an array of shape (lanes, networks, outputs).
+        """
+        n_inputs = self.n_inputs
+        self.activations[..., :n_inputs] = inputs
+        signals = np.einsum("lpj,pij->lpi", self.activations, self.weights)
+        values = _apply_functions(signals, self.slopes, self.shifts,
+                                  self.functions)
+        if active is None:
+            self.activations[..., n_inputs:] = values[..., n_inputs:]
+        else:
+            active = np.broadcast_to(active, self.activations.shape[:2])
+            self.activations[active, n_inputs:] = values[active, n_inputs:]
+        return self.activations[..., n_inputs:n_inputs+self.n_outputs]
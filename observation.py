@@ -0,0 +1,234 @@
+import time
+
+import numpy as np
+
+
+class Feature:
+    """An input of the players computed from a Dino_engine every frame.
+
+    A feature writes its values into `out`, a view of the observation
+    buffer of shape (size,), or (players, size) when some features of the
+    observation differ between the players. Shared features are written
+    with broadcasting (out[...] = value) so they fill every row.
+    """
+
+    def __init__(self, name, compute, size = 1, per_player = False):
+        """Initialize the feature.
+
+        Keyword arguments:
+        name -- name of the feature in the registry
+        compute -- function(engine, out) writing the values into out
+        size -- number of values of the feature (default 1)
+        per_player -- True if the values differ between the players
+                      (default False)
+        """
+        self.name = name
+        self.compute = compute
+        self.size = size
+        self.per_player = per_player
+
+
+# Registry of the features, by name. Parameterized features are built by
+# the factories from a "name:argument" spec, see get_feature.
+FEATURES = dict()
+FEATURE_FACTORIES = dict()
+# The state the players have always been given.
+DEFAULT_FEATURES = ("ground_step", "closest_distance", "next_distance",
+                    "closest_heights")
+
+
+def register_feature(name, size = 1, per_player = False):
+    """Decorator adding a compute function to the registry.
+
+    Keyword arguments:
+    name -- name of the feature
+    size -- number of values of the feature (default 1)
+    per_player -- True if the values differ between the players
+                  (default False)
+    """
+    def register(compute):
+        FEATURES[name] = Feature(name, compute, size, per_player)
+        return compute
+    return register
+
+
+def get_feature(spec):
+    """Return the Feature of a spec, a registered name or "name:argument"
+    for parameterized features (for example "clusters:3")."""
+    if isinstance(spec, Feature):
+        return spec
+    name, _, argument = spec.partition(":")
+    if name in FEATURE_FACTORIES:
+        return FEATURE_FACTORIES[name](*([int(argument)] if argument else []))
+    if argument or name not in FEATURES:
+        raise ValueError("unknown feature " + spec)
+    return FEATURES[name]
+
+
+@register_feature("ground_step")
+def _ground_step(engine, out):
+    out[...] = int(engine.ground_step)
+
+
+@register_feature("closest_distance")
+def _closest_distance(engine, out):
+    out[...] = engine.closest_obstacle_distance
+
+
+@register_feature("next_distance")
+def _next_distance(engine, out):
+    out[...] = engine.next_obstacle_distance
+
+
+@register_feature("closest_heights", size = 5)
+def _closest_heights(engine, out):
+    out[...] = engine.closest_obstacle_heights
+
+
+@register_feature("speed")
+def _speed(engine, out):
+    out[...] = engine.ground_step
+
+
+@register_feature("dino_y", per_player = True)
+def _dino_y(engine, out):
+    out[..., 0] = engine.dino_y
+
+
+@register_feature("jump_phase", per_player = True)
+def _jump_phase(engine, out):
+    # 1 going up, -1 going down and 0 running.
+    out[..., 0] = engine.jumping_a
+    out[..., 0] -= engine.jumping_d
+
+
+@register_feature("obstacle_gap")
+def _obstacle_gap(engine, out):
+    # Free ground between the closest cluster and the next one.
+    clusters = engine.upcoming_clusters(2)
+    if not clusters:
+        out[...] = engine.WEIGHT - engine.dino_x - engine.dino_size[0]
+    elif len(clusters) == 1:
+        out[...] = engine.WEIGHT - clusters[0][1]
+    else:
+        out[...] = clusters[1][0] - clusters[0][1]
+
+
+def cluster_feature(count = 3):
+    """Return the feature (distance, width, height) of each of the next
+    count clusters of obstacles, missing clusters are at the right edge of
+    the screen with no width or height.
+
+    Keyword arguments:
+    count -- number of clusters (default 3)
+    """
+    def compute(engine, out):
+        front = engine.dino_x + engine.dino_size[0]
+        values = [engine.WEIGHT - front, 0, 0] * count
+        for i, (left, right, height) in enumerate(
+                engine.upcoming_clusters(count)):
+            values[3*i:3*i + 3] = left - front, right - left, height
+        out[...] = values
+    return Feature("clusters:" + str(count), compute, 3 * count)
+
+
+FEATURE_FACTORIES["clusters"] = cluster_feature
+
+
+def observation_size(features = DEFAULT_FEATURES):
+    """Number of values of the observation made of features."""
+    return sum(get_feature(spec).size for spec in features)
+
+
+class Observation:
+    """State vector of a Dino game written in place every frame.
+
+    The values of the features live in a preallocated float64 buffer
+    followed by a bias slot always equal to 1, so the same memory is reused
+    at every frame and can be handed to a network as one contiguous input.
+    When a feature differs between the players the buffer has one row per
+    player. Policies get read-only views of the buffer.
+    """
+
+    def __init__(self, features = DEFAULT_FEATURES, n_players = 1,
+                 buffer = None, offset = None, scale = None,
+                 track_costs = False):
+        """Initialize the buffer.
+
+        Keyword arguments:
+        features -- names, specs or Feature objects of the observation
+                    (default DEFAULT_FEATURES)
+        n_players -- number of players of the game (default 1)
+        buffer -- float64 array of shape self.shape to write into, for
+                  example a slice of a batch (default None, allocate one)
+        offset -- value subtracted from every feature (default None)
+        scale -- value multiplying every feature after the offset
+                 (default None)
+        track_costs -- measure the time spent computing every feature
+                       (default False)
+        """
+        self.features = [get_feature(spec) for spec in features]
+        self.size = sum(feature.size for feature in self.features)
+        self.per_player = any(feature.per_player
+                              for feature in self.features)
+        if self.per_player:
+            self.shape = (n_players, self.size + 1)
+        else:
+            self.shape = (self.size + 1,)
+        if buffer is None:
+            buffer = np.zeros(self.shape)
+        assert buffer.dtype == np.float64 and buffer.shape == self.shape
+        self.buffer = buffer
+        self.buffer[..., self.size] = 1
+        self.offset = None if offset is None else np.asarray(offset, float)
+        self.scale = None if scale is None else np.asarray(scale, float)
+        # Writable views of every feature, used by update.
+        self.values = self.buffer[..., :self.size]
+        self.outputs = list()
+        start = 0
+        for feature in self.features:
+            self.outputs.append(
+                    (feature, self.buffer[..., start:start + feature.size])
+                    )
+            start += feature.size
+        # Read-only views given to the policies.
+        self.state = self.values.view()
+        self.state.flags.writeable = False
+        self.inputs = self.buffer.view()
+        self.inputs.flags.writeable = False
+        # Time spent in every feature.
+        self.costs = None
+        if track_costs:
+            self.costs = dict.fromkeys(
+                    [feature.name for feature in self.features], 0.0
+                    )
+        self.frames = 0
+
+    def __len__(self):
+        return self.size
+
+    def update(self, engine):
+        """Compute every feature of the engine's current frame."""
+        if self.costs is None:
+            for feature, out in self.outputs:
+                feature.compute(engine, out)
+        else:
+            for feature, out in self.outputs:
+                start = time.perf_counter()
+                feature.compute(engine, out)
+                self.costs[feature.name] += time.perf_counter() - start
+        self.frames += 1
+        self.normalize()
+
+    def normalize(self):
+        """Apply the offset and the scale to the raw features in place."""
+        if self.offset is not None:
+            np.subtract(self.values, self.offset, out=self.values)
+        if self.scale is not None:
+            np.multiply(self.values, self.scale, out=self.values)
+
+    def cost_report(self):
+        """Return the mean time in seconds spent computing every feature
+        per frame, costs must be tracked."""
+        frames = max(self.frames, 1)
+        return {name: cost / frames for name, cost in self.costs.items()}
@@ -0,0 +1,150 @@
+import csv
+import json
+import os
+import time
+
+import numpy as np
+
+
+class Frame_profiler:
+    """Time spent in every phase of the frames of a game.
+
+    The game marks the end of each phase with lap, which adds the time
+    elapsed since the previous mark to the phase, so a phase costs one
+    clock read. The times of every frame are kept until end_generation
+    aggregates them into the mean, p50 and p99 of every phase and appends
+    them to the history, which can be saved as JSON or CSV.
+    """
+
+    # Phases of a frame in the order they happen.
+    PHASES = ("events", "wait", "physics", "obstacles", "generation",
+              "collision", "network", "background", "text", "blit", "flip")
+
+    def __init__(self, overlay = False, overlay_every = 30):
+        """Initialize the counters.
+
+        Keyword arguments:
+        overlay -- paint the times of the last frames in the HUD
+                   (default False)
+        overlay_every -- number of frames between two updates of the
+                         overlay (default 30)
+        """
+        self.overlay = overlay
+        self.overlay_every = overlay_every
+        self.index = {phase: i for i, phase in enumerate(self.PHASES)}
+        self.frames = list()
+        self.current = None
+        self.last = None
+        self.history = list()
+        self.overlay_lines = list()
+
+    def __len__(self):
+        return len(self.frames)
+
+    def begin_frame(self):
+        """Start the clock of a new frame."""
+        self.current = [0.0] * len(self.PHASES)
+        self.last = time.perf_counter()
+
+    def lap(self, phase):
+        """Add the time elapsed since the previous mark to phase."""
+        now = time.perf_counter()
+        self.current[self.index[phase]] += now - self.last
+        self.last = now
+
+    def end_frame(self):
+        """Keep the times of the frame."""
+        if self.current is None:
+            return
+        self.frames.append(self.current)
+        self.current = None
+        if self.overlay and len(self.frames) % self.overlay_every == 0:
+            self.overlay_lines = self.format_lines(
+                    self.frames[-self.overlay_every:]
+                    )
+
+    def summary(self, frames = None):
+        """Return the number of frames and the mean, p50, p99 and total
+        time in milliseconds of every phase and of the whole frame.
+
+        Keyword arguments:
+        frames -- times of the frames to summarize (default None, every
+                  frame since the last generation)
+        """
+        if frames is None:
+            frames = self.frames
+        times = np.array(frames, dtype = float).reshape(-1, len(self.PHASES))
+        times = np.hstack([times, times.sum(axis = 1, keepdims = True)])
+        stats = dict()
+        for i, phase in enumerate(self.PHASES + ("frame",)):
+            phase_times = times[:, i] * 1000
+            if len(phase_times) == 0:
+                phase_times = np.zeros(1)
+            stats[phase] = {"mean": float(phase_times.mean()),
+                            "p50": float(np.percentile(phase_times, 50)),
+                            "p99": float(np.percentile(phase_times, 99)),
+                            "total": float(phase_times.sum())}
+        return {"frames": len(times), "phases": stats}
+
+    def format_lines(self, frames = None, count = 5):
+        """Return one line of text with the p50 and p99 in milliseconds of
+        the whole frame and of each of the count slowest phases."""
+        stats = self.summary(frames)["phases"]
+        phases = sorted(self.PHASES,
+                        key = lambda phase: -stats[phase]["total"])
+        return [f"{phase} {stats[phase]['p50']:.2f} / "
+                f"{stats[phase]['p99']:.2f} ms"
+                for phase in ("frame",) + tuple(phases[:count])
+                if stats[phase]["total"] > 0]
+
+    def end_generation(self, generation):
+        """Aggregate the frames of a generation into the history, reset
+        the frames and return the summary.
+
+        Keyword arguments:
+        generation -- number of the generation
+        """
+        summary = self.summary()
+        summary["generation"] = generation
+        self.history.append(summary)
+        self.frames = list()
+        return summary
+
+    def report(self, summary, count = 4):
+        """Return a line with the p50 / p99 of the slowest phases of a
+        summary.
+
+        Keyword arguments:
+        summary -- summary returned by end_generation
+        count -- number of phases shown (default 4)
+        """
+        phases = sorted(self.PHASES,
+                        key = lambda phase: -summary["phases"][phase]["total"])
+        frame = summary["phases"]["frame"]
+        parts = [f"frame {frame['p50']:.2f}/{frame['p99']:.2f}"]
+        for phase in phases[:count]:
+            times = summary["phases"][phase]
+            if times["total"] > 0:
+                parts.append(f"{phase} {times['p50']:.2f}/{times['p99']:.2f}")
+        return " | ".join(parts) + " ms (p50/p99)"
+
+    def save(self, path):
+        """Write the history to path, as CSV if its name ends with .csv
+        and JSON otherwise. The file is written through a temporary file so
+        it can be read while the training runs."""
+        temporary = path + ".tmp"
+        if path.endswith(".csv"):
+            with open(temporary, "w", newline = "") as profile_file:
+                writer = csv.writer(profile_file)
+                writer.writerow(["generation", "phase", "frames", "mean_ms",
+                                 "p50_ms", "p99_ms", "total_ms"])
+                for summary in self.history:
+                    for phase, times in summary["phases"].items():
+                        writer.writerow([summary.get("generation"), phase,
+                                         summary["frames"], times["mean"],
+                                         times["p50"], times["p99"],
+                                         times["total"]])
+        else:
+            with open(temporary, "w") as profile_file:
+                json.dump(self.history, profile_file, indent = 1)
+        os.replace(temporary, path)
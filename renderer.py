@@ -0,0 +1,238 @@
+import numpy as np
+import pygame
+
+from assets import get_assets
+
+
+class Dino_renderer:
+    """Paints the frames of a Dino_engine onto the shared window.
+
+    The games decide what is shown (HUD, which sprite for the dinosaurs),
+    the renderer only knows how to paint each element.
+    """
+
+    def __init__(self, engine):
+        """Fetch the window and the sprites shared by every game.
+
+        Keyword arguments:
+        engine -- Dino_engine to paint
+        """
+        self.engine = engine
+        assets = get_assets(engine.SIZE)
+        self.display_surf = assets.display_surf
+        self.text_font = assets.text_font
+        self.text_cache = assets.text_cache
+        self.instuction_up = assets.instuction_up
+        self.ground = assets.ground
+        self.possible_obstacles = assets.possible_obstacles
+        self.dino_move_1 = assets.dino_move_1
+        self.dino_move_2 = assets.dino_move_2
+        self.dino_jump = assets.dino_jump
+        self.dino_dead = assets.dino_dead
+        # Initialize the clock and the ground scrolling.
+        self.clock = pygame.time.Clock()
+        self.ground_offset = 0
+        # Painting of the dinosaurs: y is rounded to multiples of y_step
+        # when set, and with density the sprites painted for more
+        # dinosaurs are more opaque.
+        self.y_step = None
+        self.density = False
+        self.density_sprites = dict()
+
+    def tick(self):
+        """Wait for the next frame, the game runs at 60 frames per second."""
+        return self.clock.tick(60)
+
+    def scroll(self):
+        """Move the ground by the current ground step of the engine."""
+        self.ground_offset = (
+                (self.ground_offset + int(self.engine.ground_step))
+                % self.ground.get_width()
+                )
+
+    def blit(self, surface, position):
+        """Paint a surface on the window and return the area painted."""
+        return self.display_surf.blit(surface, position)
+
+    def blits(self, sequence):
+        """Paint a sequence of (surface, position) on the window in one
+        call and return the areas painted."""
+        return self.display_surf.blits(sequence)
+
+    def clear(self):
+        """Paint the window white."""
+        self.display_surf.fill((255,255,255))
+
+    def draw_background(self):
+        """Clear screen and paint the ground."""
+        self.clear()
+        #Paint ground, the second blit wraps the end of the image around
+        ground_y = self.engine.DINO_INITIAL_Y + 35
+        self.blit(self.ground, (-self.ground_offset, ground_y))
+        self.blit(self.ground,
+                  (self.ground.get_width() - self.ground_offset, ground_y))
+
+    def draw_score(self):
+        """Paint the score in the top right corner."""
+        score = self.text_cache.render(str(self.engine.score))
+        self.blit(score,
+                  (self.display_surf.get_width() - (5+score.get_width()), 0))
+
+    def draw_centered(self, text, y):
+        """Paint a string, or an already rendered surface, centered.
+
+        Keyword arguments:
+        text -- string or surface to paint
+        y -- top of the text
+        """
+        if isinstance(text, str):
+            text = self.text_cache.render(text)
+        self.blit(text,
+                  (self.display_surf.get_width()//2 - text.get_width()//2, y))
+
+    def draw_lines(self, lines, x, y):
+        """Paint lines of text one below the other.
+
+        Keyword arguments:
+        lines -- strings to paint
+        x -- left of the text
+        y -- top of the first line
+        """
+        for line in lines:
+            text = self.text_cache.render(line)
+            self.blit(text, (x, y))
+            y += text.get_height()
+
+    def draw_dinos(self, sprite = None, players = None):
+        """Paint the dinosaurs.
+
+        The dinosaurs share their x, so many of them are painted with the
+        same sprite at the same y. Only the last of these is painted,
+        which gives the same frame as painting every dinosaur in order.
+
+        Keyword arguments:
+        sprite -- paint every dinosaur with this sprite (default None,
+                  only the dinosaurs alive, running or jumping)
+        players -- indices of the dinosaurs alive to paint (default None,
+                   all of them)
+        """
+        engine = self.engine
+        if sprite is not None:
+            sprites = [sprite]
+            kinds = np.zeros(engine.n_players, dtype=np.int64)
+            y = engine.dino_y
+        else:
+            if int(engine.move_counter%2)==1:
+                running = self.dino_move_1
+            else:
+                running = self.dino_move_2
+            sprites = [running, self.dino_jump]
+            if players is None:
+                players = np.flatnonzero(engine.alive)
+            kinds = (engine.jumping_a[players]
+                     | engine.jumping_d[players]).astype(np.int64)
+            y = engine.dino_y[players]
+        x = engine.dino_x
+        if len(y) <= 8 and self.y_step is None and not self.density:
+            # Too few dinosaurs for the grouping to pay off.
+            self.blits([(sprites[kind], (x, position)) for kind, position
+                        in zip(kinds.tolist(), y.tolist())])
+            return
+        if self.y_step is not None:
+            y = np.round(y / self.y_step) * self.y_step
+        # Keep the last dinosaur of every (sprite, y), in painting order.
+        keys = y + kinds * (2 * engine.HEIGHT)
+        _, last, counts = np.unique(keys[::-1], return_index = True,
+                                    return_counts = True)
+        order = np.argsort(last)[::-1]
+        last = len(keys) - 1 - last[order]
+        counts = counts[order]
+        if not self.density:
+            self.blits([(sprites[kind], (x, position)) for kind, position
+                        in zip(kinds[last].tolist(), y[last].tolist())])
+            return
+        # The alpha grows with the share of the dinosaurs painted there.
+        alphas = 64 + 191 * counts / counts.max()
+        for kind, position, alpha in zip(kinds[last].tolist(),
+                                         y[last].tolist(), alphas.tolist()):
+            sprite = self.density_sprite(sprites[kind])
+            sprite.set_alpha(int(alpha))
+            self.blit(sprite, (x, position))
+
+    def density_sprite(self, sprite):
+        """Return a copy of a sprite whose alpha can be changed without
+        changing the shared sprite."""
+        copy = self.density_sprites.get(sprite)
+        if copy is None:
+            copy = sprite.copy()
+            self.density_sprites[sprite] = copy
+        return copy
+
+    def draw_obstacles(self):
+        """Paint the obstacles on the screen."""
+        for kind, x, y in self.engine.obstacles:
+            self.blit(self.possible_obstacles[kind], (x, y))
+
+    def flip(self):
+        """Update screen."""
+        pygame.display.flip()
+
+
+class Dirty_rect_renderer(Dino_renderer):
+    """Renderer repainting and updating only the areas that change.
+
+    The areas painted in a frame (sprites, ground and text) are recorded.
+    At the next frame only these areas are cleared, and only the areas of
+    both frames are sent to pygame.display.update instead of flipping the
+    whole window. When a frame paints more than max_rects areas, as with
+    thousands of dinosaurs, the whole window is cleared and flipped.
+    """
+
+    def __init__(self, engine, max_rects = 64):
+        """Fetch the window and the sprites shared by every game.
+
+        Keyword arguments:
+        engine -- Dino_engine to paint
+        max_rects -- number of areas from which the whole window is
+                     cleared and flipped (default 64)
+        """
+        super().__init__(engine)
+        self.max_rects = max_rects
+        # Areas painted in the current and the previous frame, None
+        # when the whole window must be repainted.
+        self.dirty = list()
+        self.previous = None
+        self.full = True
+
+    def blit(self, surface, position):
+        """Paint a surface on the window and record the area painted."""
+        rect = self.display_surf.blit(surface, position)
+        self.dirty.append(rect)
+        return rect
+
+    def blits(self, sequence):
+        """Paint a sequence of (surface, position) on the window in one
+        call and record the areas painted."""
+        rects = self.display_surf.blits(sequence)
+        self.dirty.extend(rects)
+        return rects
+
+    def clear(self):
+        """Clear the areas painted in the previous frame, or the whole
+        window after a frame with too many areas."""
+        self.full = (self.previous is None
+                     or len(self.previous) > self.max_rects)
+        if self.full:
+            self.display_surf.fill((255,255,255))
+        else:
+            for rect in self.previous:
+                self.display_surf.fill((255,255,255), rect)
+
+    def flip(self):
+        """Update the areas painted in this frame and the previous one."""
+        if self.full or len(self.dirty) > self.max_rects:
+            pygame.display.flip()
+        else:
+            pygame.display.update(self.previous + self.dirty)
+        self.previous = self.dirty
+        self.dirty = list()
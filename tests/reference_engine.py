@@ -0,0 +1,254 @@
+"""Engine of the game before its players were stored as NumPy arrays.
+
+Every player is moved and tested for collisions one by one on Python
+lists, obstacles are drawn frame by frame. It is kept as the reference the
+vectorized Dino_engine must reproduce exactly, see test_engine.py.
+"""
+import random
+
+
+FIXED_DT = 1000 / 60
+
+
+def _boxes_collide(box_a, box_b):
+    """Return True if two (left, top, width, height) boxes overlap.
+
+    Mirrors pygame.Rect.colliderect: empty boxes never collide and boxes
+    with a negative size are normalized first.
+    """
+    if 0 in (box_a[2], box_a[3], box_b[2], box_b[3]):
+        return False
+    a_x = sorted((box_a[0], box_a[0] + box_a[2]))
+    a_y = sorted((box_a[1], box_a[1] + box_a[3]))
+    b_x = sorted((box_b[0], box_b[0] + box_b[2]))
+    b_y = sorted((box_b[1], box_b[1] + box_b[3]))
+    return (a_x[0] < b_x[1] and a_y[0] < b_y[1]
+            and a_x[1] > b_x[0] and a_y[1] > b_y[0])
+
+
+class Reference_engine:
+    """Headless simulation core of the Dino game, one player at a time."""
+
+    def __init__(self, n_players = 1, dt = FIXED_DT, dino_size = (40, 43),
+                 obstacle_sizes = ((23, 49), (15, 33)), seed = None):
+        """Initialize the variables and declare constants.
+
+        Keyword arguments:
+        n_players -- number of dinosaurs running in the game (default 1)
+        dt -- duration of a frame in milliseconds (default 1000/60)
+        dino_size -- (width, height) of the dinosaur sprites
+        obstacle_sizes -- (width, height) of every kind of obstacle
+        seed -- seed of the obstacles (default None, random games)
+        """
+        # Declare constants.
+        self.SIZE = self.WEIGHT, self.HEIGHT = 640, 400
+        self.DINO_INITIAL_X = 100
+        self.DINO_INITIAL_Y = 250
+        self.MAX_JUMP_HEIGHT = 100
+        self.JUMP_SPEED_A = 0.5
+        self.JUMP_SPEED_D = 0.5
+        self.DINO_MOVE_SPEED = 0.1
+        self.GROUND_INITIAL_SPEED = 6
+        self.COLLISION_FORGIVE = 8
+        # Initialize rest of variables.
+        self.n_players = n_players
+        self.dt = dt
+        self.dino_size = tuple(dino_size)
+        self.obstacle_sizes = [tuple(size) for size in obstacle_sizes]
+        self.seed = seed
+        self.reset()
+
+    def reset(self):
+        """Reinitialize the flags and variables."""
+        self.rng = random.Random(self.seed)
+        self.dino_x = self.DINO_INITIAL_X
+        self.dino_y = [self.DINO_INITIAL_Y] * self.n_players
+        self.jumping_a = [False] * self.n_players
+        self.jumping_d = [False] * self.n_players
+        self.alive = [True] * self.n_players
+        self.fitness = [0] * self.n_players
+        self.obstacles = list()
+        self.obstacle_distance = 0
+        self.move_counter = 0
+        self.game_time = 0
+        self.frame = 0
+        self.ground_step = self.GROUND_INITIAL_SPEED
+        self.state = None
+
+    @property
+    def score(self):
+        """Current score of the game."""
+        return int(self.game_time/100)
+
+    @property
+    def players_alive(self):
+        """Number of dinosaurs still running."""
+        return sum(self.alive)
+
+    def jump(self, player):
+        """Trigger jumping event for a player if possible."""
+        if self.alive[player] and not(self.jumping_a[player]
+                                      or self.jumping_d[player]):
+            self.jumping_a[player] = True
+
+    def step(self, actions = None):
+        """Advance the game by one frame and return (state, alive, score).
+
+        Keyword arguments:
+        actions -- one jump flag per player, applied before moving
+                   (default None, nobody jumps)
+        """
+        if actions is not None:
+            for player, action in enumerate(actions):
+                if action:
+                    self.jump(player)
+        self.game_time += self.dt
+        self.frame += 1
+        self._move_dinos()
+        self._move_obstacles()
+        self.state = self._observe()
+        return self.state, self.alive, self.score
+
+    def _move_dinos(self):
+        """Update dinosaur locations if jumping."""
+        dt = self.dt
+        top = self.DINO_INITIAL_Y - self.MAX_JUMP_HEIGHT
+        slow_down = self.DINO_INITIAL_Y - self.MAX_JUMP_HEIGHT/1.5
+        for i in range(self.n_players):
+            if not self.alive[i]:
+                continue
+            if self.jumping_a[i]:
+                if self.dino_y[i] <= top:
+                    self.jumping_a[i] = False
+                    self.jumping_d[i] = True
+                elif self.dino_y[i] <= slow_down:
+                    self.dino_y[i] -= self.JUMP_SPEED_A*dt/2
+                else:
+                    self.dino_y[i] -= self.JUMP_SPEED_A*dt
+            if self.jumping_d[i]:
+                if self.dino_y[i] >= self.DINO_INITIAL_Y:
+                    self.jumping_d[i] = False
+                    self.dino_y[i] = self.DINO_INITIAL_Y
+                elif self.dino_y[i] <= slow_down:
+                    self.dino_y[i] += self.JUMP_SPEED_D*dt/2
+                else:
+                    self.dino_y[i] += self.JUMP_SPEED_D*dt
+        #Update dinosaur movement animaton
+        self.move_counter += self.DINO_MOVE_SPEED
+        if self.move_counter >= 10:
+            self.move_counter = 0
+
+    def _move_obstacles(self):
+        """Update the ground speed, generate obstacles and move them."""
+        self.ground_step = (
+                self.GROUND_INITIAL_SPEED
+                * ( 0.125*(self.game_time//10000) + 1)
+                )
+        step = int(self.ground_step)
+        self.obstacle_distance += step
+        if 300 < self.obstacle_distance <= 900:
+            generate_obstacles = self.rng.uniform(0,1) < 0.05
+        else:
+            generate_obstacles = 900 < self.obstacle_distance
+        if generate_obstacles:
+            number_obstacles = self.rng.randint(1,4)
+            last_x = self.WEIGHT
+            for i in range(number_obstacles):
+                kind = self.rng.choice(range(len(self.obstacle_sizes)))
+                width, height = self.obstacle_sizes[kind]
+                self.obstacles.append([
+                        kind,
+                        last_x,
+                        self.DINO_INITIAL_Y + self.dino_size[1] - height
+                        ])
+                last_x += width
+            self.obstacle_distance = 0
+        obstacles = list()
+        for obstacle in self.obstacles:
+            obstacle[1] -= step
+            if not obstacle[1] + self.obstacle_sizes[obstacle[0]][0] <= 0:
+                obstacles.append(obstacle)
+        self.obstacles = obstacles
+
+    def _hitbox(self, x, y, width, height):
+        """Return the collision box of a sprite painted at (x, y).
+
+        The box is clipped to the screen the same way pygame clips a blit
+        and then shrunk by COLLISION_FORGIVE on every side.
+        """
+        left, top = max(int(x), 0), max(int(y), 0)
+        right = min(int(x) + width, self.WEIGHT)
+        bottom = min(int(y) + height, self.HEIGHT)
+        if right <= left or bottom <= top:
+            width = height = 0
+        else:
+            width, height = right - left, bottom - top
+        return (left + self.COLLISION_FORGIVE,
+                top + self.COLLISION_FORGIVE,
+                width - 2 * self.COLLISION_FORGIVE,
+                height - 2 * self.COLLISION_FORGIVE)
+
+    def _observe(self):
+        """Detect collisions and return the state of the game.
+
+        The state is [ground step, distance to the closest cluster of
+        obstacles, distance to the next one, heights of the closest
+        cluster (5 values)].
+        """
+        dino_width, dino_height = self.dino_size
+        dino_left, dino_top, dino_w, _ = self._hitbox(
+                self.dino_x, self.DINO_INITIAL_Y, dino_width, dino_height
+                )
+        dino_right = dino_left + dino_w
+        obstacle_boxes = list()
+        closest_obstacle = 0
+        closest_obstacle_distance = None
+        closest_obstacle_heights = [0,0,0,0,0]
+        next_closest_obstacle_distance = None
+        i = 0
+        for kind, x, y in self.obstacles:
+            width, height = self.obstacle_sizes[kind]
+            box = self._hitbox(x, y, width, height)
+            left, top = box[0], box[1]
+            right = left + box[2]
+            if closest_obstacle is not None:
+                if closest_obstacle == 0:
+                    if dino_left <= right:
+                        obstacle_boxes.append(box)
+                        closest_obstacle = right + self.COLLISION_FORGIVE
+                        closest_obstacle_distance = left - dino_right
+                        closest_obstacle_heights[i] = top
+                        previous_top = top
+                        i += 1
+                elif closest_obstacle == left - self.COLLISION_FORGIVE:
+                    obstacle_boxes.append(box)
+                    closest_obstacle += box[2] + 2 * self.COLLISION_FORGIVE
+                    closest_obstacle_heights[i] = max(top, previous_top)
+                    previous_top = top
+                    i += 1
+                else:
+                    closest_obstacle = None
+                    closest_obstacle_heights[i] = previous_top
+            elif next_closest_obstacle_distance is None:
+                next_closest_obstacle_distance = left - dino_right
+        if next_closest_obstacle_distance is None:
+            next_closest_obstacle_distance = self.WEIGHT - dino_right
+        if closest_obstacle_distance is None:
+            closest_obstacle_distance = self.WEIGHT - dino_right
+        # Detect collision
+        for player in range(self.n_players):
+            if self.alive[player]:
+                dino_box = self._hitbox(self.dino_x, self.dino_y[player],
+                                        dino_width, dino_height)
+                for box in obstacle_boxes:
+                    if _boxes_collide(dino_box, box):
+                        self.alive[player] = False
+                        self.fitness[player] = self.score
+                        break
+        state = [
+                int(self.ground_step),
+                closest_obstacle_distance,
+                next_closest_obstacle_distance
+                ]
+        state.extend(closest_obstacle_heights)
+        return state
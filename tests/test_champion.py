@@ -0,0 +1,83 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+from Dino import Dino, Dino_player_compiled
+from network import ACTIVATION_NAMES, Compiled_network
+from observation import DEFAULT_FEATURES, observation_size
+
+try:
+    import MultiNEAT
+except ImportError:
+    MultiNEAT = None
+
+
+def recurrent_network(seed, hidden = 4):
+    """Return a random Compiled_network of the default features whose
+    hidden neurons feed each other, so its outputs depend on the previous
+    frames."""
+    rng = np.random.RandomState(seed)
+    n_inputs = observation_size() + 1
+    size = n_inputs + 1 + hidden
+    weights = rng.normal(0, 2, (size, size))
+    weights[:n_inputs] = 0
+    return Compiled_network(weights, np.ones(size), rng.normal(0, 1, size),
+                            [ACTIVATION_NAMES.index("UNSIGNED_SIGMOID")]
+                            * size, n_inputs, 1)
+
+
+class Test_champion(unittest.TestCase):
+    """A saved champion plays like the network it was saved from."""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "champion.npz")
+        self.network = recurrent_network(0)
+        self.scale = np.full(observation_size(), 0.01)
+        self.network.save(self.path, features = np.array(DEFAULT_FEATURES),
+                          feature_scale = self.scale)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def play(self, player, seed):
+        """Return the score of a headless game of the player."""
+        game = Dino(player, seed = seed, headless = True,
+                    features = player.features,
+                    feature_offset = player.feature_offset,
+                    feature_scale = player.feature_scale)
+        return game.on_execute()
+
+    def test_load(self):
+        player = Dino_player_compiled(self.path)
+        self.assertEqual(player.network.digest(), self.network.digest())
+        self.assertEqual(player.features, DEFAULT_FEATURES)
+        self.assertIsNone(player.feature_offset)
+        self.assertEqual(player.feature_scale.tolist(), self.scale.tolist())
+
+    def test_games_reset_the_network(self):
+        player = Dino_player_compiled(self.path)
+        for seed in range(3):
+            first = self.play(player, seed)
+            self.assertEqual(self.play(player, seed), first)
+        game = Dino(player, seed = 0, headless = True)
+        player.network.activations[:] = 1
+        game.reinit()
+        self.assertFalse(player.network.activations.any())
+
+    @unittest.skipIf(MultiNEAT is None, "MultiNEAT is not installed")
+    def test_play_compiled(self):
+        from neat import play_compiled
+        player = Dino_player_compiled(self.path)
+        scores = play_compiled(self.network, range(3),
+                               features = player.features,
+                               feature_scale = self.scale)[0]
+        self.assertEqual([self.play(player, seed) for seed in range(3)],
+                         scores)
+
+
+if __name__ == "__main__":
+    unittest.main()
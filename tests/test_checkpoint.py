@@ -0,0 +1,62 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from checkpoint import latest_checkpoint, write_checkpoint
+
+
+def write_text(text):
+    """Return a writer of a file holding text."""
+    def write(path):
+        with open(path, "w") as text_file:
+            text_file.write(text)
+    return write
+
+
+class Test_checkpoint(unittest.TestCase):
+    """The latest complete checkpoint is found after an interrupted
+    save."""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        for generation in (1, 2):
+            write_checkpoint(self.directory, generation,
+                             {"state.txt": write_text(str(generation))})
+        self.path = os.path.join(self.directory, "generation_00002")
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_latest(self):
+        self.assertEqual(latest_checkpoint(self.directory), self.path)
+        with open(os.path.join(self.path, "state.txt")) as state_file:
+            self.assertEqual(state_file.read(), "2")
+
+    def test_keep(self):
+        write_checkpoint(self.directory, 3, {}, keep = 2)
+        self.assertEqual(sorted(os.listdir(self.directory)),
+                         ["generation_00002", "generation_00003", "latest"])
+
+    def test_missing_latest_file(self):
+        os.remove(os.path.join(self.directory, "latest"))
+        self.assertEqual(latest_checkpoint(self.directory), self.path)
+
+    def test_interrupted_write(self):
+        # The files of generation 3 were not all written.
+        os.makedirs(os.path.join(self.directory, "generation_00003.tmp"))
+        self.assertEqual(latest_checkpoint(self.directory), self.path)
+
+    def test_interrupted_replace(self):
+        # Generation 2 was moved aside before being replaced.
+        os.replace(self.path, self.path + ".old")
+        self.assertEqual(latest_checkpoint(self.directory),
+                         self.path + ".old")
+
+    def test_missing_directory(self):
+        missing = os.path.join(self.directory, "missing")
+        self.assertIsNone(latest_checkpoint(missing))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,45 @@
+import unittest
+
+import numpy as np
+
+from engine import Dino_engine
+from reference_engine import Reference_engine
+
+
+def jump_flags(seed, n_players, frames):
+    """Return the seeded (frames, n_players) jump flags of a game."""
+    rng = np.random.RandomState(seed)
+    return rng.random_sample((frames, n_players)) < 0.05
+
+
+class Test_engine_equivalence(unittest.TestCase):
+    """The vectorized engine plays exactly like the per-player one."""
+
+    def check_game(self, seed, n_players, frames = 3000):
+        reference = Reference_engine(n_players, seed = seed)
+        engine = Dino_engine(n_players, seed = seed)
+        for frame, actions in enumerate(jump_flags(seed, n_players, frames)):
+            state, alive, score = reference.step(actions)
+            engine_state, engine_alive, engine_score = engine.step(actions)
+            message = "seed %d, frame %d" % (seed, frame)
+            self.assertEqual(engine_state.tolist(), state, message)
+            self.assertEqual(engine_alive.tolist(), alive, message)
+            self.assertEqual(engine_score, score, message)
+            self.assertEqual(engine.dino_y.tolist(), reference.dino_y,
+                             message)
+            self.assertEqual(engine.fitness.tolist(), reference.fitness,
+                             message)
+            if not any(alive):
+                break
+
+    def test_single_player(self):
+        for seed in range(5):
+            self.check_game(seed, 1)
+
+    def test_population(self):
+        for seed in range(3):
+            self.check_game(seed, 50)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,63 @@
+import unittest
+
+import numpy as np
+
+from network import Batched_network, compile_network
+
+try:
+    import MultiNEAT as NEAT
+except ImportError:
+    NEAT = None
+
+
+def evolved_networks(size = 30, generations = 5, seed = 0):
+    """Return the MultiNEAT networks of a population evolved on random
+    fitness, with hidden neurons and recurrent links."""
+    params = NEAT.Parameters()
+    params.PopulationSize = size
+    params.MutateAddNeuronProb = 0.3
+    params.MutateAddLinkProb = 0.3
+    params.RecurrentProb = 0.2
+    genome = NEAT.Genome(0, 9, 0, 1, False,
+                         NEAT.ActivationFunction.UNSIGNED_SIGMOID,
+                         NEAT.ActivationFunction.UNSIGNED_SIGMOID,
+                         0, params, 0)
+    population = NEAT.Population(genome, params, True, 1.0, seed)
+    rng = np.random.RandomState(seed)
+    for _ in range(generations):
+        for genome in NEAT.GetGenomeList(population):
+            genome.SetFitness(rng.random_sample())
+        population.Epoch()
+    networks = list()
+    for genome in NEAT.GetGenomeList(population):
+        network = NEAT.NeuralNetwork()
+        genome.BuildPhenotype(network)
+        networks.append(network)
+    return networks
+
+
+@unittest.skipIf(NEAT is None, "MultiNEAT is not installed")
+class Test_compiled_network(unittest.TestCase):
+    """The compiled networks give the outputs of MultiNEAT."""
+
+    def test_activate(self):
+        networks = evolved_networks()
+        compiled = [compile_network(network) for network in networks]
+        batched = Batched_network(compiled)
+        self.assertGreater(max(network.size for network in compiled), 10)
+        rng = np.random.RandomState(1)
+        for _ in range(50):
+            inputs = np.append(rng.random_sample(8) * 300, 1)
+            expected = list()
+            for network in networks:
+                network.Input(inputs.tolist())
+                network.Activate()
+                expected.append(network.Output()[0])
+            outputs = [network.activate(inputs)[0] for network in compiled]
+            np.testing.assert_allclose(outputs, expected, atol = 1e-9)
+            np.testing.assert_allclose(batched.activate(inputs)[0, :, 0],
+                                       expected, atol = 1e-9)
+
+
+if __name__ == "__main__":
+    unittest.main()
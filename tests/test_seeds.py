@@ -0,0 +1,59 @@
+import contextlib
+import io
+import unittest
+
+from Dino import Dino, Dino_player_random
+from engine import Dino_engine, Obstacle_course, Stopping_rules
+
+try:
+    import MultiNEAT
+except ImportError:
+    MultiNEAT = None
+
+
+class Test_seeds(unittest.TestCase):
+    """The same seed plays the same game."""
+
+    def test_course(self):
+        course = Obstacle_course(3)
+        course.generate(2000)
+        other = Obstacle_course(3)
+        other.generate(2000)
+        self.assertEqual(course.obstacles.tolist(), other.obstacles.tolist())
+        different = Obstacle_course(4)
+        different.generate(2000)
+        self.assertNotEqual(course.obstacles.tolist(),
+                            different.obstacles.tolist())
+
+    def test_engine_reset(self):
+        engine = Dino_engine(seed = 5)
+        first = [engine.step()[0].tolist() for _ in range(300)]
+        engine.reset()
+        second = [engine.step()[0].tolist() for _ in range(300)]
+        self.assertEqual(first, second)
+
+    def test_games(self):
+        scores = [Dino(Dino_player_random(seed = 1), seed = 2,
+                       headless = True).on_execute()
+                  for _ in range(2)]
+        self.assertEqual(scores[0], scores[1])
+
+    @unittest.skipIf(MultiNEAT is None, "MultiNEAT is not installed")
+    def test_training(self):
+        from neat import NEAT_trainer
+        results = list()
+        for workers in (0, 0, 2):
+            trainer = NEAT_trainer(20, generations = 3, headless = True,
+                                   seed = 7, workers = workers,
+                                   stopping = Stopping_rules(
+                                           max_frames = 2000
+                                           ))
+            with contextlib.redirect_stdout(io.StringIO()):
+                trainer.start_cycle(one_by_one = workers > 0)
+            results.append(trainer.best_fitness)
+        self.assertEqual(results[0], results[1])
+        self.assertEqual(results[0], results[2])
+
+
+if __name__ == "__main__":
+    unittest.main()